@@ -0,0 +1,182 @@
+import base64
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import mutagen
+from mutagen.flac import Picture
+from mutagen.id3 import ID3
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+FOLDER_ART_NAMES = ('cover', 'folder', 'front', 'album')
+FOLDER_ART_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+FRONT_COVER = 3  # Picture type of the front cover in ID3 and FLAC
+
+
+def _pick_cover(pictures):
+    # pictures: [(picture_type, data)], the front cover wins over any other picture
+    for picture_type, data in pictures:
+        if picture_type == FRONT_COVER:
+            return data
+    return pictures[0][1] if pictures else None
+
+
+def read_embedded_art(filepath):
+    """Bytes of the cover image embedded in filepath (ID3 APIC, FLAC/Vorbis pictures, MP4 covr), or None."""
+    try:
+        audio = mutagen.File(filepath)
+    except mutagen.MutagenError:
+        return None
+    if audio is None:
+        return None
+    pictures = [(picture.type, picture.data) for picture in getattr(audio, 'pictures', ())]
+    tags = audio.tags
+    if isinstance(tags, ID3):
+        pictures += [(frame.type, frame.data) for frame in tags.getall('APIC')]
+    elif tags is not None:
+        for encoded in tags.get('metadata_block_picture', ()):
+            try:
+                picture = Picture(base64.b64decode(encoded))
+            except (ValueError, mutagen.MutagenError):
+                continue
+            pictures.append((picture.type, picture.data))
+        pictures += [(FRONT_COVER, bytes(cover)) for cover in tags.get('covr', ())]
+    return _pick_cover(pictures)
+
+
+def find_folder_art(directory):
+    """Path of a cover.jpg / folder.jpg style image in directory, or None."""
+    try:
+        with os.scandir(directory) as entries:
+            names = {entry.name.lower(): entry.path for entry in entries if entry.is_file()}
+    except OSError:
+        return None
+    for name in FOLDER_ART_NAMES:
+        for extension in FOLDER_ART_EXTENSIONS:
+            path = names.get(name + extension)
+            if path:
+                return path
+    return None
+
+
+def read_album_art(filepaths, max_tracks=3):
+    """Cover image bytes for an album, from the first tracks' tags or an image next to them."""
+    for filepath in filepaths[:max_tracks]:
+        data = read_embedded_art(filepath)
+        if data:
+            return data
+    for directory in dict.fromkeys(os.path.dirname(filepath) for filepath in filepaths[:max_tracks]):
+        path = find_folder_art(directory)
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError as e:
+                print(f"Error reading album art {path}: {e}")
+    return None
+
+
+class AlbumArtCache(QObject):
+    """
+    Album art thumbnails, loaded off the UI thread.
+
+    Covers are extracted and downscaled on a worker pool and written to an on-disk cache
+    named after the hash of the original image, so albums (and tracks) sharing a cover
+    share one thumbnail and a cover is only ever decoded at full size once. Thumbnails in
+    use are kept as QPixmaps in a small LRU. pixmap() never blocks: it returns None and
+    emits art_ready(key) once the art is there.
+    """
+    art_ready = pyqtSignal(object)
+    _loaded = pyqtSignal(object, object, object)  # key, digest, QImage or None
+
+    def __init__(self, cache_dir=os.path.join("data", "art_cache"), size=200, max_pixmaps=300, workers=2, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_pixmaps = max_pixmaps
+        os.makedirs(cache_dir, exist_ok=True)
+        self._pixmaps = OrderedDict()  # {digest: QPixmap}, least recently used first
+        self._digests = {}  # {key: digest}, None when the album has no art
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._loaded.connect(self._on_loaded)  # Queued, the worker threads hand over to the UI thread
+
+    def pixmap(self, key, filepaths):
+        """
+        Thumbnail for key (e.g. an (artist, album) pair) whose tracks are filepaths, or None if
+        there is none or it is still loading.
+        """
+        if key in self._digests:
+            digest = self._digests[key]
+            if digest is None:
+                return None
+            pixmap = self._pixmaps.get(digest)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(digest)
+                return pixmap
+        if key not in self._pending and self._executor is not None:
+            self._pending.add(key)
+            self._executor.submit(self._load, key, list(filepaths), self._digests.get(key))
+        return None
+
+    def _thumbnail_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_{self.size}.png")
+
+    def _load(self, key, filepaths, known_digest=None):
+        try:
+            if known_digest is not None:
+                # Fell out of the LRU, the thumbnail on disk is all we need
+                image = QImage(self._thumbnail_path(known_digest))
+                if not image.isNull():
+                    self._loaded.emit(key, known_digest, image)
+                    return
+            data = read_album_art(filepaths)
+            if data is None:
+                self._loaded.emit(key, None, None)
+                return
+            digest = hashlib.sha1(data).hexdigest()
+            thumbnail_path = self._thumbnail_path(digest)
+            image = QImage(thumbnail_path) if os.path.exists(thumbnail_path) else QImage()
+            if image.isNull():
+                image = QImage.fromData(data)
+                if image.isNull():
+                    self._loaded.emit(key, None, None)
+                    return
+                image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                self._save_thumbnail(image, thumbnail_path)
+            self._loaded.emit(key, digest, image)
+        except Exception as e:
+            print(f"Error loading album art for {key}: {e}")
+            self._loaded.emit(key, None, None)
+
+    def _save_thumbnail(self, image, thumbnail_path):
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(thumbnail_path), suffix=".png")
+        os.close(fd)
+        if image.save(temp_path, "PNG"):
+            os.replace(temp_path, thumbnail_path)  # Other workers never see half a thumbnail
+        else:
+            os.remove(temp_path)
+
+    def _on_loaded(self, key, digest, image):
+        self._pending.discard(key)
+        self._digests[key] = digest
+        if digest is None:
+            return
+        if digest not in self._pixmaps:
+            self._pixmaps[digest] = QPixmap.fromImage(image)
+            while len(self._pixmaps) > self.max_pixmaps:
+                self._pixmaps.popitem(last=False)
+        self.art_ready.emit(key)
+
+    def forget(self, key):
+        """Drops what is known about key, e.g. after its tracks changed, the next pixmap() reloads it."""
+        self._digests.pop(key, None)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,98 @@
+import threading
+from bisect import insort
+
+
+class AlbumIndex:
+    """
+    Keeps {artist: {album_name: [filepaths]}} up to date as songs come and go, each album
+    ordered by release date. Only the album a song belongs to is touched, and the albums
+    that changed are remembered so views can update just those (see take_diffs).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.albums = {}
+        self._lock = threading.Lock()
+        self._diffs = {}  # {(artist, album): 'added' | 'changed' | 'removed'}
+        self._reset = False
+        for song in store.values():
+            self.song_added(song.track_id)
+        store.add_listener(self)
+
+    def _sort_key(self, filepath):
+        track_id = self.store.track_id(filepath)
+        return (self.store.release_ordinals[track_id], track_id)
+
+    def _record(self, key, change):
+        previous = self._diffs.get(key)
+        if previous == 'added' and change == 'removed':
+            del self._diffs[key]  # Came and went before anyone looked
+        elif previous == 'added':
+            pass
+        elif previous == 'removed' and change == 'added':
+            self._diffs[key] = 'changed'
+        else:
+            self._diffs[key] = change
+
+    def song_added(self, track_id):
+        store = self.store
+        artist = store.strings[store.artist_ids[track_id]]
+        album = store.strings[store.album_ids[track_id]]
+        with self._lock:
+            artist_albums = self.albums.setdefault(artist, {})
+            album_files = artist_albums.get(album)
+            if album_files is None:
+                artist_albums[album] = [store.filepaths[track_id]]
+                self._record((artist, album), 'added')
+            else:
+                insort(album_files, store.filepaths[track_id], key=self._sort_key)
+                self._record((artist, album), 'changed')
+
+    def song_removed(self, track_id):
+        store = self.store
+        artist = store.strings[store.artist_ids[track_id]]
+        album = store.strings[store.album_ids[track_id]]
+        with self._lock:
+            album_files = self.albums.get(artist, {}).get(album)
+            if album_files is None:
+                return
+            album_files.remove(store.filepaths[track_id])
+            if album_files:
+                self._record((artist, album), 'changed')
+                return
+            del self.albums[artist][album]
+            if not self.albums[artist]:
+                del self.albums[artist]
+            self._record((artist, album), 'removed')
+
+    def store_cleared(self):
+        with self._lock:
+            self.albums = {}
+            self._diffs.clear()
+            self._reset = True
+
+    def album_keys(self):
+        """[(artist, album_name)] of every album, a snapshot safe to walk while songs come and go."""
+        with self._lock:
+            return [(artist, album) for artist, albums in self.albums.items() for album in albums]
+
+    def album_files(self, artist, album):
+        """A copy of the album's filepaths in release order, [] if there is no such album."""
+        with self._lock:
+            return list(self.albums.get(artist, {}).get(album, ()))
+
+    def artist_albums(self, artist):
+        """{album_name: [filepaths]} of one artist, copied."""
+        with self._lock:
+            return {album: list(files) for album, files in self.albums.get(artist, {}).items()}
+
+    def take_diffs(self):
+        """
+        Returns (reset, [(change, artist, album), ...]) for everything since the last call.
+        When reset is True the whole index was rebuilt and views should start over.
+        """
+        with self._lock:
+            reset, self._reset = self._reset, False
+            diffs = [(change, artist, album) for (artist, album), change in self._diffs.items()]
+            self._diffs.clear()
+        return reset, diffs
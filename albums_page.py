@@ -1,13 +1,167 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QGridLayout, QLabel,
-                             QScrollArea, QFrame)
-from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt
+from bisect import bisect_left
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QListView,
+                             QStyledItemDelegate, QStyle)
+from PyQt5.QtGui import QFont, QFontMetrics, QColor, QPixmap, QPainter
+from PyQt5.QtCore import Qt, QSize, QRect, QAbstractListModel, QModelIndex
+
+TILE_WIDTH = 180
+ART_SIZE = 120
+
+
+def _album_sort_key(key):
+    artist, album_name = key
+    return (artist.casefold(), album_name.casefold(), artist, album_name)
+
+
+class AlbumListModel(QAbstractListModel):
+    """
+    One row per (artist, album) of the library's album index, sorted by artist and album.
+    Kept in step with the index through its diffs, so a change only touches its own row.
+    Art is asked for when a row is painted, i.e. only for tiles that are on screen.
+    """
+
+    def __init__(self, library_manager, album_art=None, parent=None):
+        super().__init__(parent)
+        self.library_manager = library_manager
+        self.album_art = album_art
+        self._keys = []  # [(artist, album_name)], in row order
+        self._sort_keys = []
+        if album_art is not None:
+            album_art.art_ready.connect(self._on_album_art_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._keys):
+            return None
+        artist, album_name = self._keys[index.row()]
+        if role == Qt.DisplayRole:
+            return album_name
+        if role == Qt.ToolTipRole:
+            return f"{album_name} - {artist}"
+        return None
+
+    def album_at(self, row):
+        return self._keys[row]
+
+    def album_files(self, row):
+        artist, album_name = self._keys[row]
+        return self.library_manager.album_index.album_files(artist, album_name)
+
+    def art_at(self, row):
+        """The album's thumbnail, None while it loads (or if there is none)."""
+        if self.album_art is None:
+            return None
+        return self.album_art.pixmap(self._keys[row], self.album_files(row))
+
+    def _row_of(self, key):
+        row = bisect_left(self._sort_keys, _album_sort_key(key))
+        if row < len(self._keys) and self._keys[row] == key:
+            return row
+        return None
+
+    def reset(self):
+        self.beginResetModel()
+        self._keys = sorted(self.library_manager.album_index.album_keys(), key=_album_sort_key)
+        self._sort_keys = [_album_sort_key(key) for key in self._keys]
+        self.endResetModel()
+
+    def apply_diffs(self, diffs):
+        for change, artist, album_name in diffs:
+            key = (artist, album_name)
+            row = self._row_of(key)
+            if change == 'removed':
+                if row is not None:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                    del self._keys[row]
+                    del self._sort_keys[row]
+                    self.endRemoveRows()
+            elif row is None:
+                sort_key = _album_sort_key(key)
+                row = bisect_left(self._sort_keys, sort_key)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._keys.insert(row, key)
+                self._sort_keys.insert(row, sort_key)
+                self.endInsertRows()
+            else:
+                if self.album_art is not None:
+                    self.album_art.forget(key)  # The tracks the art came from may have changed
+                self.dataChanged.emit(self.index(row), self.index(row))
+
+    def _on_album_art_ready(self, key):
+        row = self._row_of(key)
+        if row is not None:
+            self.dataChanged.emit(self.index(row), self.index(row), [Qt.DecorationRole])
+
+
+class AlbumTileDelegate(QStyledItemDelegate):
+    """
+    Paints an album tile (art, album name, artist, song count) without creating any widgets.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.album_font = QFont("Arial", 12, QFont.Bold)
+        self.artist_font = QFont("Arial", 10, italic=True)
+        self.count_font = QFont("Arial", 9)
+        self.album_metrics = QFontMetrics(self.album_font)
+        self.artist_metrics = QFontMetrics(self.artist_font)
+        self.count_metrics = QFontMetrics(self.count_font)
+        self.tile_height = (10 + ART_SIZE + 6 + self.album_metrics.height() + self.artist_metrics.height()
+                            + self.count_metrics.height() + 10)
+        self.placeholder_art = None  # Created on first paint, QPixmaps need the GUI up
+
+    def paint(self, painter, option, index):
+        if not index.isValid():
+            return
+        model = index.model()
+        artist, album_name = model.album_at(index.row())
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            background = QColor("#460060")
+        elif option.state & QStyle.State_MouseOver:
+            background = QColor("#3A0050")
+        else:
+            background = QColor("#320046")
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(background)
+        painter.drawRoundedRect(option.rect.adjusted(2, 2, -2, -2), 5, 5)
+
+        rect = option.rect.adjusted(10, 10, -10, -10)
+        art = model.art_at(index.row())
+        if art is None:
+            if self.placeholder_art is None:
+                self.placeholder_art = QPixmap(ART_SIZE, ART_SIZE)
+                self.placeholder_art.fill(Qt.darkGray)
+            art = self.placeholder_art
+        art_rect = QRect(rect.x() + (rect.width() - ART_SIZE) // 2, rect.y(), ART_SIZE, ART_SIZE)
+        painter.drawPixmap(art_rect, art)
+
+        y = art_rect.bottom() + 6
+        for text, font, metrics, color in (
+                (album_name, self.album_font, self.album_metrics, "#FFFFFF"),
+                (artist, self.artist_font, self.artist_metrics, "#AAAAAA"),
+                (f"{len(model.album_files(index.row()))} songs", self.count_font, self.count_metrics, "#BBBBBB")):
+            painter.setFont(font)
+            painter.setPen(QColor(color))
+            painter.drawText(QRect(rect.x(), y, rect.width(), metrics.height()), Qt.AlignCenter,
+                             metrics.elidedText(text, Qt.ElideRight, rect.width()))
+            y += metrics.height()
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(TILE_WIDTH, self.tile_height)
 
 
 class AlbumsPage(QWidget):
-    def __init__(self, library_manager, parent=None):
+    def __init__(self, library_manager, album_art=None, parent=None):
         super().__init__(parent)
         self.library_manager = library_manager
+        self.album_art = album_art  # AlbumArtCache, tiles show a placeholder without one
         self.layout = QVBoxLayout(self)
 
         # Title Label
@@ -16,64 +170,35 @@ class AlbumsPage(QWidget):
         title_label.setFont(QFont("Arial", 20, QFont.Bold))
         self.layout.addWidget(title_label)
 
-        # Scroll Area to contain the albums grid
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.albums_content = QWidget()
-        self.grid_layout = QGridLayout(self.albums_content)
-        self.scroll_area.setWidget(self.albums_content)
-        self.layout.addWidget(self.scroll_area)
+        # Icon mode list view: only the tiles on screen are painted, however many albums there are
+        self.albums_model = AlbumListModel(library_manager, album_art, self)
+        self.albums_view = QListView()
+        self.albums_view.setViewMode(QListView.IconMode)
+        self.albums_view.setResizeMode(QListView.Adjust)
+        self.albums_view.setMovement(QListView.Static)
+        self.albums_view.setLayoutMode(QListView.Batched)
+        self.albums_view.setUniformItemSizes(True)
+        self.albums_view.setSpacing(10)
+        self.albums_view.setMouseTracking(True)
+        self.albums_view.setModel(self.albums_model)
+        self.albums_view.setItemDelegate(AlbumTileDelegate(self.albums_view))
+        self.layout.addWidget(self.albums_view)
 
         self._populate_albums()
 
     def _populate_albums(self):
-        # Clear any existing widgets in the grid
-        for i in reversed(range(self.grid_layout.count())):
-            widget = self.grid_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
-
-        albums_data = self.library_manager.albums
-        row = 0
-        col = 0
-        for artist, albums in albums_data.items():
-            for album_name in sorted(albums.keys()):
-                album_widget = self._create_album_widget(artist, album_name, len(albums[album_name]))
-                self.grid_layout.addWidget(album_widget, row, col)
-                col += 1
-                if col > 2:  # Display 3 albums per row
-                    col = 0
-                    row += 1
-
-        # Add a stretch at the end to prevent empty space if the grid doesn't fill the last row
-        self.grid_layout.addItem(QVBoxLayout(), row + 1, 0, 1, self.grid_layout.columnCount())
-
-    def _create_album_widget(self, artist, album_name, song_count):
-        album_frame = QFrame()
-        album_frame_layout = QVBoxLayout(album_frame)
-        album_frame.setStyleSheet("background-color: #28003C; border-radius: 5px; padding: 10px;")
-
-        album_label = QLabel(album_name)
-        album_label.setFont(QFont("Arial", 12, QFont.Bold))
-        album_label.setAlignment(Qt.AlignCenter)
-        album_label.setStyleSheet("color: #FFFFFF;")
-        album_frame_layout.addWidget(album_label)
-
-        artist_label = QLabel(artist)
-        artist_label.setFont(QFont("Arial", 10, italic=True))  # Corrected line: using keyword argument
-        artist_label.setAlignment(Qt.AlignCenter)
-        artist_label.setStyleSheet("color: #AAAAAA;")
-        album_frame_layout.addWidget(artist_label)
-
-        count_label = QLabel(f"{song_count} songs")
-        count_label.setFont(QFont("Arial", 9))
-        count_label.setAlignment(Qt.AlignCenter)
-        count_label.setStyleSheet("color: #BBBBBB;")
-        album_frame_layout.addWidget(count_label)
-
-        # You could add a placeholder for album art here if you have that functionality
-
-        return album_frame
+        self.library_manager.album_index.take_diffs()  # Everything is built from scratch below
+        self.albums_model.reset()
+
+    def refresh(self):
+        """
+        Apply the album changes since the last refresh, only touching the affected tiles.
+        """
+        reset, diffs = self.library_manager.album_index.take_diffs()
+        if reset:
+            self.albums_model.reset()
+            return
+        self.albums_model.apply_diffs(diffs)
 
     def apply_theme(self):
         """
@@ -81,7 +206,4 @@ class AlbumsPage(QWidget):
         """
         # Modify the main background and album grid style
         self.setStyleSheet("background-color: #28003C; color: white;")
-        for i in range(self.grid_layout.count()):
-            widget = self.grid_layout.itemAt(i).widget()
-            if isinstance(widget, QFrame):
-                widget.setStyleSheet("background-color: #320046; border-radius: 5px; padding: 10px;")
+        self.albums_view.setStyleSheet("QListView { background-color: #28003C; border: none; }")
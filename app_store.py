@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from core.ordered_playlist import OrderedPlaylist
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    filepath TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS playlist_entries (
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (playlist_id, track_id)
+);
+CREATE TABLE IF NOT EXISTS play_counts (
+    track_id INTEGER PRIMARY KEY REFERENCES tracks(id),
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS play_history (
+    id INTEGER PRIMARY KEY,
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
+    played_at REAL NOT NULL,
+    listened REAL,
+    weight REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decayed_scores (
+    track_id INTEGER PRIMARY KEY REFERENCES tracks(id),
+    score REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS library_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class AppDataStore:
+    """
+    SQLite (WAL mode) storage shared by the playlist and favorites managers.
+
+    One connection is reused for everything; transaction() groups several writes into a
+    single commit and nests, so a bulk operation can wrap calls that open their own.
+    Use AppDataStore.shared(data_file) so every manager pointed at the same data file
+    shares one store. The JSON data_file of older versions is imported on first open.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, data_file):
+        key = os.path.abspath(data_file)
+        with cls._shared_lock:
+            store = cls._shared.get(key)
+            if store is None or store.connection is None:
+                store = cls._shared[key] = cls(os.path.splitext(data_file)[0] + ".db", legacy_json_file=data_file)
+            return store
+
+    def __init__(self, db_file, legacy_json_file=None):
+        self.db_file = db_file
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._track_ids = {}
+        self.connection = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, never corrupt
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        if legacy_json_file and self.get_meta('json_migrated') is None:
+            self._migrate_json(legacy_json_file)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                    self._track_ids.clear()  # May hold ids of rows that were just rolled back
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def track_id(self, filepath):
+        """Id of filepath in the tracks table, added on first use. Call inside a transaction."""
+        track_id = self._track_ids.get(filepath)
+        if track_id is None:
+            with self.transaction() as connection:
+                connection.execute("INSERT OR IGNORE INTO tracks (filepath) VALUES (?)", (filepath,))
+                track_id = connection.execute("SELECT id FROM tracks WHERE filepath = ?", (filepath,)).fetchone()[0]
+            self._track_ids[filepath] = track_id
+        return track_id
+
+    def get_meta(self, key, default=None):
+        rows = self.query("SELECT value FROM library_meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_meta(self, key, value):
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO library_meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def close(self):
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _migrate_json(self, data_file):
+        playlists, favorites = _read_legacy_json(data_file)
+        with self.transaction() as connection:
+            for name, songs in playlists.items():
+                connection.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (name,))
+                playlist_id = connection.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()[0]
+                connection.executemany(
+                    "INSERT OR IGNORE INTO playlist_entries VALUES (?, ?, ?)",
+                    [(playlist_id, self.track_id(filepath), position) for position, filepath in enumerate(songs)])
+            connection.executemany(
+                "INSERT OR REPLACE INTO play_counts VALUES (?, ?)",
+                [(self.track_id(filepath), count) for filepath, count in favorites.items()])
+            self.set_meta('json_migrated', data_file)
+
+
+def _read_legacy_json(data_file):
+    """Playlists and play counts from the JSON data file of older versions."""
+    data = {}
+    if os.path.exists(data_file):
+        with open(data_file, 'r') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                data = {}
+    # Duplicates were possible in the JSON lists, a playlist holds each song once
+    playlists = {name: OrderedPlaylist(songs) for name, songs in data.get('playlists', {}).items()}
+    return playlists, dict(data.get('favorites', {}))
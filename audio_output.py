@@ -0,0 +1,167 @@
+import threading
+import time
+import wave
+
+try:
+    import pygame
+except ImportError:  # Only PygameOutput needs it
+    pygame = None
+
+
+class AudioOutput:
+    """
+    Where the playback engine sends decoded audio: interleaved signed 16-bit PCM blocks.
+
+    write() blocks until the output can take the block, which is what paces playback.
+    latency is how many seconds of written audio are still waiting to be heard.
+    """
+    latency = 0.0
+
+    def open(self, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_bytes = channels * 2
+
+    def write(self, block):
+        raise NotImplementedError
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def flush(self):
+        """Drops audio written but not heard yet, e.g. after a seek."""
+
+    def set_volume(self, volume):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Pacer:
+    # Sleeps so that writes go at the speed they would be played at, without drifting
+    def __init__(self):
+        self.deadline = None
+        self._interrupted = threading.Event()
+
+    def wait(self, seconds):
+        self._interrupted.clear()
+        now = time.monotonic()
+        if self.deadline is None or self.deadline < now:
+            self.deadline = now  # Starting out, or we fell behind: don't try to catch up
+        self.deadline += seconds
+        self._interrupted.wait(max(0.0, self.deadline - time.monotonic()))
+
+    def reset(self):
+        # Like a sound card dropping its buffer: the block being "played" ends right away
+        self.deadline = None
+        self._interrupted.set()
+
+
+class NullOutput(AudioOutput):
+    """
+    Discards the audio. With realtime=True it takes as long as playing it would, so the
+    engine behaves as it does on a sound card; otherwise it runs as fast as decoding allows.
+    """
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self.frames_written = 0
+        self._pacer = _Pacer()
+
+    def write(self, block):
+        frames = len(block) // self.frame_bytes
+        self.frames_written += frames
+        if self.realtime:
+            self._pacer.wait(frames / self.sample_rate)
+
+    def pause(self):
+        self._pacer.reset()
+
+    def flush(self):
+        self._pacer.reset()
+
+
+class WavFileOutput(NullOutput):
+    """Writes what would have been played to a WAV file, e.g. to check gapless transitions by ear or by diff."""
+
+    def __init__(self, filepath, realtime=False):
+        super().__init__(realtime)
+        self.filepath = filepath
+        self._wave = None
+
+    def open(self, sample_rate, channels):
+        super().open(sample_rate, channels)
+        self._wave = wave.open(self.filepath, 'wb')
+        self._wave.setnchannels(channels)
+        self._wave.setsampwidth(2)
+        self._wave.setframerate(sample_rate)
+
+    def write(self, block):
+        self._wave.writeframes(block)
+        super().write(block)
+
+    def close(self):
+        if self._wave is not None:
+            self._wave.close()
+            self._wave = None
+
+
+class PygameOutput(AudioOutput):
+    """
+    Plays through a reserved pygame mixer channel. Each block becomes a Sound queued behind
+    the one playing, so at most one block is waiting in the mixer at any time.
+    """
+
+    def __init__(self, mixer_buffer=1024):
+        if pygame is None:
+            raise RuntimeError("pygame is needed for PygameOutput")
+        self.mixer_buffer = mixer_buffer
+        self.channel = None
+        self.volume = 0.5
+        self._block_seconds = 0.0
+
+    def open(self, sample_rate, channels):
+        super().open(sample_rate, channels)
+        if pygame.mixer.get_init() != (sample_rate, -16, channels):
+            pygame.mixer.quit()
+            pygame.mixer.init(frequency=sample_rate, size=-16, channels=channels, buffer=self.mixer_buffer)
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self.channel.set_volume(self.volume)
+
+    @property
+    def latency(self):
+        return self._block_seconds if self.channel is not None and self.channel.get_queue() is not None else 0.0
+
+    def write(self, block):
+        sound = pygame.mixer.Sound(buffer=block)
+        self._block_seconds = len(block) / self.frame_bytes / self.sample_rate
+        if not self.channel.get_busy():
+            self.channel.play(sound)
+            return
+        while self.channel.get_queue() is not None:
+            time.sleep(self._block_seconds / 4)
+        self.channel.queue(sound)
+
+    def pause(self):
+        self.channel.pause()
+
+    def resume(self):
+        self.channel.unpause()
+
+    def flush(self):
+        self.channel.stop()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.channel is not None:
+            self.channel.set_volume(volume)
+
+    def close(self):
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
@@ -1,100 +1,205 @@
+import os
 import mutagen
-import pygame
+
+from core.audio_output import PygameOutput
+from core.playback_engine import PlaybackEngine
+
+try:
+    from core.dsp import DspChain, Equalizer, GainRamp, PcmTap, TrackGain
+except ImportError:  # Without NumPy there is no EQ and the output does the volume
+    DspChain = None
 
 class AudioPlayer:
-    def __init__(self):
-        pygame.mixer.init()
+    """
+    Plays one track at a time on a PlaybackEngine: a decoder thread fills a ring buffer of
+    PCM blocks that an output backend (pygame by default, see core.audio_output) plays.
+
+    The track that comes next (set_next) is opened by the decoder ahead of time and follows
+    the current one without a gap. Call poll() regularly (a UI timer is fine) to hear about
+    that handover. The position is kept by the engine from the blocks actually handed to the
+    output, so it stays exact however often the user seeks.
+    Track lengths come from the library (set songs to the LibraryManager's SongStore), which
+    measured them during the scan; files outside the library are parsed once and remembered.
+    on_transition, if set, is called from poll() as on_transition(previous, current, latency,
+    gapless) for every track change, latency being the seconds from the request until the
+    first audio of the new track reached the output.
+    With NumPy the volume is a gain ramp in the engine's DSP chain, after the equalizer, so
+    changing it never clicks. The chain also applies each track's ReplayGain, looked up with
+    replay_gain(filepath) (normally LibraryManager.track_gain) when the track starts, and ends
+    in tap, a copy of the latest audio for meters and visualizers (see core.spectrum).
+    """
+
+    def __init__(self, output=None, block_frames=2048, buffer_blocks=16, tap=None):
+        self.volume = 0.5
+        self.replay_gain = None  # callable(filepath) returning a linear gain or None
+        self.normalize = True
+        self.gain = self.equalizer = self.tap = dsp = None
+        if DspChain is not None:
+            self.gain = GainRamp(44100, self.volume)
+            self.equalizer = Equalizer(44100, 2)
+            self.tap = tap or PcmTap(2)
+            dsp = DspChain(2, [self.equalizer, TrackGain(self._track_gain), self.gain, self.tap])
+        self.engine = PlaybackEngine(output or PygameOutput(), block_frames=block_frames, buffer_blocks=buffer_blocks,
+                                     dsp=dsp)
+        self.engine.start()
+        self.sample_rate = self.engine.sample_rate
         self.current_track = None
         self.paused = False
-        self.volume = 0.5
+        self.engine.set_volume(1.0 if self.gain is not None else self.volume)
+        self.next_track = None
+        self.on_transition = None
+        self.songs = None  # {filepath: song} with a 'duration', normally the library's SongStore
+        self._lengths = {}  # {filepath: seconds} for tracks the library doesn't know
+        self._current_length = 0
 
     def load(self, filepath):
-        try:
-            pygame.mixer.music.load(filepath)
-            self.current_track = filepath
-        except pygame.error as e:
-            print(f"Error loading {filepath}: {e}")
+        if not os.path.exists(filepath):
+            print(f"Error loading {filepath}: file not found")
             self.current_track = None
+            self._current_length = 0
+            return
+        self.current_track = filepath
+        self._current_length = self._track_length(filepath)
 
     def play(self):
         if self.current_track:
-            try:
-                pygame.mixer.music.play()
-                self.paused = False
-            except Exception as e:
-                print(f"Error while trying to play: {e}")
+            self.engine.play(self.current_track)
+            self.paused = False
+
+    def set_next(self, filepath):
+        """Sets the track that follows the current one, the decoder opens it ahead of time."""
+        if filepath == self.next_track:
+            return
+        self.next_track = filepath
+        self.engine.set_next(filepath)
+
+    def poll(self):
+        """
+        Reports what happened on the engine since the last call, returns the new current
+        track if it moved on to the next one by itself, otherwise None.
+        """
+        new_track = None
+        for event in self.engine.take_events():
+            if event[0] != 'started':
+                continue
+            _, previous, track, latency, gapless = event
+            if gapless:
+                self.current_track = new_track = track
+                self._current_length = self._track_length(track)
+                self.next_track = None
+            if self.on_transition is not None:
+                self.on_transition(previous, track, latency, gapless)
+        return new_track
 
     def pause(self):
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.pause()
+        if self.current_track and not self.paused:
+            self.engine.pause()
             self.paused = True
 
     def unpause(self):
         if self.paused and self.current_track:
-            pygame.mixer.music.unpause()
+            self.engine.resume()
             self.paused = False
 
     def stop(self):
-        pygame.mixer.music.stop()
+        self.engine.stop()
         self.current_track = None
+        self.next_track = None
         self.paused = False
 
-    def next(self, playlist):
-        if not playlist or not self.current_track:
-            return None
-        try:
-            current_index = playlist.index(self.current_track)
-            next_index = (current_index + 1) % len(playlist)
-            next_track = playlist[next_index]
+    def close(self):
+        self.engine.close()
+
+    def next(self, queue):
+        """Moves queue (a PlayQueue) on to the next song and plays it, returns its filepath."""
+        next_track = queue.next()
+        if next_track:
             self.load(next_track)
             self.play()
-            return next_track
-        except ValueError:
-            return None # Current track not in playlist
+        return next_track
 
-    def prev(self, playlist):
-        if not playlist or not self.current_track:
-            return None
-        try:
-            current_index = playlist.index(self.current_track)
-            prev_index = (current_index - 1 + len(playlist)) % len(playlist)
-            prev_track = playlist[prev_index]
+    def prev(self, queue):
+        prev_track = queue.prev()
+        if prev_track:
             self.load(prev_track)
             self.play()
-            return prev_track
-        except ValueError:
-            return None
+        return prev_track
+
+    def seek(self, position):
+        """
+        Jumps to position (seconds from the start of the track), returns the position
+        actually used. The decoder moves in place and the buffered audio is dropped.
+        """
+        if not self.current_track:
+            return 0.0
+        position = max(0.0, position)
+        if self._current_length > 0:
+            position = min(position, self._current_length)
+        self.engine.seek(position)
+        return position
 
     def skip_forward(self, seconds=5):
-        if pygame.mixer.music.get_busy():
-            current_pos = pygame.mixer.music.get_pos() / 1000  # in seconds
-            pygame.mixer.music.rewind()
-            pygame.mixer.music.play(start=current_pos + seconds)
+        return self.seek(self.get_current_time() + seconds)
 
     def skip_backward(self, seconds=5):
-        if pygame.mixer.music.get_busy():
-            current_pos = pygame.mixer.music.get_pos() / 1000  # in seconds
-            rewind_to = max(0, current_pos - seconds)
-            pygame.mixer.music.rewind()
-            pygame.mixer.music.play(start=rewind_to)
+        return self.seek(self.get_current_time() - seconds)
 
     def set_volume(self, volume):
         self.volume = max(0.0, min(1.0, volume))
-        pygame.mixer.music.set_volume(self.volume)
+        if self.gain is not None:
+            self.gain.set_gain(self.volume)
+        else:
+            self.engine.set_volume(self.volume)
 
     def get_volume(self):
         return self.volume
 
+    def set_equalizer(self, bands):
+        """bands as for core.dsp.Equalizer, e.g. [('lowshelf', 100, 3.0, 0.7)], [] for flat."""
+        if self.equalizer is None:
+            print("The equalizer needs NumPy")
+            return
+        self.equalizer.set_bands(bands)
+
+    def set_normalize(self, normalize):
+        """Switches ReplayGain on or off, from the next track on."""
+        self.normalize = normalize
+
+    def set_crossfade(self, seconds):
+        """Overlaps the end of each track with the start of the next, 0 to switch it off."""
+        self.engine.set_crossfade(seconds)
+
     def get_current_time(self):
-        if pygame.mixer.music.get_busy():
-            return pygame.mixer.music.get_pos() / 1000  # in seconds
-        return 0
+        """Position in the current track in seconds."""
+        if not self.current_track:
+            return 0
+        position = self.engine.position()
+        if self._current_length > 0:
+            return min(position, self._current_length)
+        return position
 
-    def get_track_length(self):
-        if self.current_track:
+    def _track_gain(self, filepath):
+        # Called on the engine's output thread when a track starts
+        if not self.normalize or self.replay_gain is None:
+            return None
+        return self.replay_gain(filepath)
+
+    def _track_length(self, filepath):
+        song = self.songs.get(filepath) if self.songs is not None else None
+        if song is not None and song['duration']:
+            return song['duration']
+        length = self._lengths.get(filepath)
+        if length is None:
             try:
-                audio = mutagen.File(self.current_track)
-                return audio.info.length
+                audio = mutagen.File(filepath)
+                length = audio.info.length if audio is not None else 0
             except mutagen.MutagenError:
-                return 0
+                length = 0
+            self._lengths[filepath] = length
+        return length
+
+    def get_track_length(self):
+        """Length of the current track in seconds, from memory, cheap enough to poll every frame."""
+        if self.current_track:
+            return self._current_length
         return 0
@@ -0,0 +1,330 @@
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:  # No tap, so no visualizer, but playback works the same
+    np = None
+
+# seq, commands run, position, clock, length, frames_written, playing. The player process
+# bumps seq to an odd number while it writes and back to even when done (a seqlock):
+# readers never wait on it, they read again if seq was odd or moved under them.
+TELEMETRY = struct.Struct('<QQdddQ?')
+SEQ = struct.Struct('<Q')
+RING_OFFSET = 64  # The tap's float32 stereo ring starts after the telemetry
+RING_FRAMES = 8192
+CHANNELS = 2
+
+# What the UI may ask of the player process, everything else stays in the proxy
+COMMANDS = {'load', 'play', 'set_next', 'pause', 'unpause', 'stop', 'seek', 'set_volume',
+            'set_equalizer', 'set_crossfade', 'set_normalize', 'describe'}
+
+
+def _serve(conn, shm_name, publish_interval, output_factory, player_options):
+    # Main of the player process: one thread runs commands and publishes telemetry, the
+    # engine's decoder and output threads do the rest
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    from core.audio_player import AudioPlayer
+    try:
+        from core.dsp import PcmTap
+    except ImportError:
+        PcmTap = None
+    # Spawned children share the UI's resource tracker, so the UI stays the one to unlink it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    tap = None
+    if PcmTap is not None:
+        tap = PcmTap(CHANNELS, RING_FRAMES, buffer=shm.buf[RING_OFFSET:RING_OFFSET + RING_FRAMES * CHANNELS * 4])
+    player = AudioPlayer(output=output_factory() if output_factory else None, tap=tap, **player_options)
+    try:
+        _PlayerServer(player, conn, shm.buf).run(publish_interval)
+    finally:
+        player.close()  # The shared memory is the UI's, it goes away with this process
+
+
+class _PlayerServer:
+    def __init__(self, player, conn, buf):
+        self.player = player
+        self.conn = conn
+        self.buf = buf
+        self.seq = 0
+        self.commands = 0
+        self.songs = {}  # {filepath: {'duration': seconds}} as described by the UI
+        self.gains = {}
+        player.songs = self.songs
+        player.replay_gain = self.gains.get
+        player.on_transition = self._on_transition
+
+    def run(self, publish_interval):
+        while True:
+            if self.conn.poll(publish_interval):
+                try:
+                    command, args = self.conn.recv()
+                except EOFError:
+                    return  # The UI is gone
+                if command == 'close':
+                    return
+                self.commands += 1
+                try:
+                    if command not in COMMANDS:
+                        raise ValueError("not a player command")
+                    if command == 'describe':
+                        self._describe(*args)
+                    else:
+                        getattr(self.player, command)(*args)
+                except Exception as e:
+                    print(f"Error running {command} in the player process: {e}")
+            self.player.poll()
+            self._publish()
+
+    def _describe(self, filepath, duration, gain):
+        self.songs[filepath] = {'duration': duration}
+        if gain is None:
+            self.gains.pop(filepath, None)
+        else:
+            self.gains[filepath] = gain
+
+    def _on_transition(self, previous, current, latency, gapless):
+        self.conn.send(('started', previous, current, latency, gapless))
+
+    def _publish(self):
+        player = self.player
+        tap = player.tap
+        self.seq += 1
+        SEQ.pack_into(self.buf, 0, self.seq)
+        TELEMETRY.pack_into(self.buf, 0, self.seq, self.commands, player.get_current_time(), time.monotonic(),
+                            player.get_track_length(), tap.frames_written if tap is not None else 0,
+                            bool(player.current_track) and not player.paused)
+        self.seq += 1
+        SEQ.pack_into(self.buf, 0, self.seq)
+
+
+class _RemoteTap:
+    # What core.spectrum needs of a PcmTap, over the ring in shared memory
+    def __init__(self, player, buf):
+        self._player = player
+        self.ring = np.ndarray((RING_FRAMES, CHANNELS), dtype=np.float32, buffer=buf, offset=RING_OFFSET)
+
+    @property
+    def frames_written(self):
+        return self._player.telemetry()[5]
+
+
+class RemoteAudioPlayer:
+    """
+    The AudioPlayer API, served by a player process so that a busy UI thread can't stall
+    transitions or seeks: the engine's threads don't share a GIL with the UI anymore.
+
+    Commands go to the player process over a pipe and return right away. Position, length,
+    play state and the tap's ring of recent audio (for core.spectrum) are published by the
+    player process through shared memory, and read here without locking or waiting.
+    Track changes come back over the pipe and are reported by poll() as with AudioPlayer.
+
+    songs and replay_gain work as on AudioPlayer, the proxy looks tracks up and passes on
+    their length and gain when they are loaded or queued. output_factory, e.g.
+    functools.partial(NullOutput, realtime=True), makes the output in the player process,
+    pygame by default; player_options go to its AudioPlayer.
+    """
+
+    def __init__(self, output_factory=None, publish_interval=0.01, **player_options):
+        self.shm = shared_memory.SharedMemory(create=True, size=RING_OFFSET + RING_FRAMES * CHANNELS * 4)
+        TELEMETRY.pack_into(self.shm.buf, 0, 0, 0, 0.0, 0.0, 0.0, 0, False)
+        # spawn, forking a process that runs Qt and the voice assistant's threads isn't safe
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, name="VoxTune player", daemon=True,
+                                       args=(child_conn, self.shm.name, publish_interval, output_factory, player_options))
+        self.process.start()
+        child_conn.close()
+        self.sample_rate = 44100
+        self.tap = _RemoteTap(self, self.shm.buf) if np is not None else None
+        self.current_track = None
+        self.paused = False
+        self.volume = 0.5
+        self.next_track = None
+        self.normalize = True
+        self.on_transition = None
+        self.songs = None
+        self.replay_gain = None
+        self._current_length = 0
+        self._lengths = {}  # {filepath: seconds} of the tracks described to the player process
+        self._telemetry = (0, 0, 0.0, 0.0, 0.0, 0, False)
+        self._sent = 0
+        self._expected = None  # (commands sent, position, since, playing) until the player process ran them
+
+    def _send(self, command, *args):
+        try:
+            self.conn.send((command, args))
+            self._sent += 1
+        except (BrokenPipeError, OSError) as e:
+            print(f"Error sending {command} to the player process: {e}")
+
+    def _describe(self, filepath):
+        song = self.songs.get(filepath) if self.songs is not None else None
+        duration = song['duration'] if song is not None else 0
+        gain = self.replay_gain(filepath) if self.replay_gain is not None else None
+        self._lengths[filepath] = duration
+        self._send('describe', filepath, duration, gain)
+        return duration
+
+    def _expect(self, position, playing):
+        # Until the player process publishes a position taken after it ran the command
+        self._expected = (self._sent, position, time.monotonic(), playing)
+
+    def telemetry(self):
+        """(seq, commands run, position, clock, length, frames_written, playing) as last published, never blocks."""
+        buf = self.shm.buf
+        for _ in range(100):
+            seq = SEQ.unpack_from(buf, 0)[0]
+            if seq & 1:
+                continue  # Being written right now
+            values = TELEMETRY.unpack_from(buf, 0)
+            if values[0] == seq and SEQ.unpack_from(buf, 0)[0] == seq:
+                self._telemetry = values
+                break
+        return self._telemetry
+
+    def load(self, filepath):
+        if not os.path.exists(filepath):
+            print(f"Error loading {filepath}: file not found")
+            self.current_track = None
+            self._current_length = 0
+            return
+        self.current_track = filepath
+        self._current_length = self._describe(filepath)
+        self._send('load', filepath)
+
+    def play(self):
+        if self.current_track:
+            self._send('play')
+            self.paused = False
+            self._expect(0.0, True)
+
+    def set_next(self, filepath):
+        if filepath == self.next_track:
+            return
+        self.next_track = filepath
+        if filepath:
+            self._describe(filepath)
+        self._send('set_next', filepath)
+
+    def poll(self):
+        """Reports track changes from the player process, returns the new current track like AudioPlayer.poll()."""
+        new_track = None
+        try:
+            while self.conn.poll():
+                _, previous, track, latency, gapless = self.conn.recv()
+                if gapless:
+                    self.current_track = new_track = track
+                    self._current_length = self._lengths.get(track, 0)
+                    self.next_track = None
+                if self.on_transition is not None:
+                    self.on_transition(previous, track, latency, gapless)
+        except (EOFError, OSError):
+            pass  # The player process is gone, close() tidies up
+        return new_track
+
+    def pause(self):
+        if self.current_track and not self.paused:
+            position = self.get_current_time()
+            self._send('pause')
+            self._expect(position, False)
+            self.paused = True
+
+    def unpause(self):
+        if self.paused and self.current_track:
+            position = self.get_current_time()
+            self._send('unpause')
+            self._expect(position, True)
+            self.paused = False
+
+    def stop(self):
+        self._send('stop')
+        self.current_track = None
+        self.next_track = None
+        self.paused = False
+        self._expected = None
+
+    def close(self):
+        if self.process.is_alive():
+            self._send('close')
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.conn.close()
+        if self.tap is not None:
+            self.tap.ring = None  # Views on the shared memory have to go before it can close
+        self.shm.close()
+        self.shm.unlink()
+
+    def next(self, queue):
+        next_track = queue.next()
+        if next_track:
+            self.load(next_track)
+            self.play()
+        return next_track
+
+    def prev(self, queue):
+        prev_track = queue.prev()
+        if prev_track:
+            self.load(prev_track)
+            self.play()
+        return prev_track
+
+    def seek(self, position):
+        if not self.current_track:
+            return 0.0
+        position = max(0.0, position)
+        length = self.get_track_length()
+        if length > 0:
+            position = min(position, length)
+        self._send('seek', position)
+        self._expect(position, not self.paused)
+        return position
+
+    def skip_forward(self, seconds=5):
+        return self.seek(self.get_current_time() + seconds)
+
+    def skip_backward(self, seconds=5):
+        return self.seek(self.get_current_time() - seconds)
+
+    def set_volume(self, volume):
+        self.volume = max(0.0, min(1.0, volume))
+        self._send('set_volume', self.volume)
+
+    def get_volume(self):
+        return self.volume
+
+    def set_equalizer(self, bands):
+        self._send('set_equalizer', list(bands))
+
+    def set_crossfade(self, seconds):
+        self._send('set_crossfade', seconds)
+
+    def set_normalize(self, normalize):
+        self.normalize = normalize
+        self._send('set_normalize', normalize)
+
+    def get_current_time(self):
+        """Position in the current track in seconds, moved on from the last published one by the clock."""
+        if not self.current_track:
+            return 0
+        _, commands, position, clock, length, _, playing = self.telemetry()
+        if self._expected is not None:
+            if commands >= self._expected[0]:
+                self._expected = None
+            else:
+                _, position, clock, playing = self._expected
+        if playing:
+            position += time.monotonic() - clock
+        length = self._current_length or length
+        if length > 0:
+            return min(position, length)
+        return position
+
+    def get_track_length(self):
+        if not self.current_track:
+            return 0
+        return self._current_length or self.telemetry()[4]
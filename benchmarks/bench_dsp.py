@@ -0,0 +1,93 @@
+"""
+CPU cost of each DSP stage on 44.1kHz stereo, as a share of one core while playing, and
+of the spectrum visualizer's analysis at 60 frames a second.
+
+    python -m benchmarks.bench_dsp --seconds 60 --block-frames 2048
+
+Every stage runs on the engine's output thread once per block, so anything near a few
+percent here would show up as underruns on a slow machine.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core import dsp
+from core.dsp import DspChain, EqualPowerCrossfade, Equalizer, GainRamp, PcmTap
+from core.spectrum import SpectrumAnalyzer
+
+SAMPLE_RATE = 44100
+BANDS = [('lowshelf', 100, 4.0, 0.7), ('peak', 1000, -3.0, 1.0), ('highshelf', 8000, 2.0, 0.7)]
+
+
+class _Ramping:
+    # Keeps the gain ramp busy, otherwise it only multiplies by a constant
+    def __init__(self, ramp):
+        self.ramp = ramp
+        self.high = False
+
+    def process(self, samples):
+        self.high = not self.high
+        self.ramp.set_gain(0.9 if self.high else 0.1)
+        self.ramp.process(samples)
+
+
+def measure(name, blocks, process, seconds):
+    start = time.perf_counter()
+    for block in blocks:
+        process(block)
+    elapsed = time.perf_counter() - start
+    print(f"{name:24} {elapsed / seconds * 100:8.3f} % of a core  ({elapsed / len(blocks) * 1e6:7.1f} us per block)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--block-frames", type=int, default=2048)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    count = int(args.seconds * SAMPLE_RATE) // args.block_frames
+    seconds = count * args.block_frames / SAMPLE_RATE
+    pcm = [rng.integers(-20000, 20000, (args.block_frames, 2), dtype=np.int16).tobytes() for _ in range(count)]
+    chain = DspChain(2)
+
+    ramp = _Ramping(GainRamp(SAMPLE_RATE))
+    measure("gain ramp", pcm, lambda data: ramp.process(chain.to_float(data)), seconds)
+
+    steady = GainRamp(SAMPLE_RATE, 0.5)
+    measure("gain (steady)", pcm, lambda data: steady.process(chain.to_float(data)), seconds)
+
+    sosfilt = dsp.sosfilt
+    if sosfilt is not None:
+        eq = Equalizer(SAMPLE_RATE, 2, BANDS)
+        measure("eq, 3 bands (scipy)", pcm, lambda data: eq.process(chain.to_float(data)), seconds)
+    dsp.sosfilt = None
+    try:
+        eq = Equalizer(SAMPLE_RATE, 2, BANDS)
+        measure("eq, 3 bands (fft)", pcm, lambda data: eq.process(chain.to_float(data)), seconds)
+    finally:
+        dsp.sosfilt = sosfilt
+
+    fade = EqualPowerCrossfade(SAMPLE_RATE, args.seconds)
+    offsets = iter(range(0, count * args.block_frames, args.block_frames))
+    measure("crossfade mix", pcm, lambda data: fade.mix_pcm(data, data, next(offsets), 2), seconds)
+
+    tap = PcmTap(2)
+    measure("pcm tap", pcm, lambda data: tap.process(chain.to_float(data)), seconds)
+
+    full = DspChain(2, [Equalizer(SAMPLE_RATE, 2, BANDS), _Ramping(GainRamp(SAMPLE_RATE)), PcmTap(2)])
+    measure("full chain (pcm in/out)", pcm, full.process, seconds)
+
+    # One analyzer update per frame, with a new block in the tap every time
+    analyzer = SpectrumAnalyzer(tap, SAMPLE_RATE)
+    frames = [chain.to_float(data).copy() for data in pcm[:int(seconds * 60)]]
+
+    def analyze(samples):
+        tap.process(samples)
+        analyzer.update()
+    measure("spectrum at 60fps", frames, analyze, len(frames) / 60)
+
+
+if __name__ == '__main__':
+    main()
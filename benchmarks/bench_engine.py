@@ -0,0 +1,107 @@
+"""
+PlaybackEngine on a headless box: CPU per second of audio, start/seek latency, underruns
+and gapless handover, using the null and WAV file outputs.
+
+    python -m benchmarks.bench_engine --tracks 3 --seconds 20
+    python -m benchmarks.bench_engine --realtime --seconds 5 --block-frames 512   # paced like a sound card
+
+Without --realtime the output takes blocks as fast as they come, so the numbers show the
+engine's own overhead. The WAV file sink must end up with exactly the frames of all tracks
+back to back, otherwise a transition lost or repeated audio.
+"""
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+from core.audio_output import NullOutput, WavFileOutput
+from core.playback_engine import PlaybackEngine
+
+SAMPLE_RATE = 44100
+
+
+def write_tone(filepath, seconds, level):
+    frame = level.to_bytes(2, 'little', signed=True) * 2
+    with wave.open(filepath, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(frame * int(seconds * SAMPLE_RATE))
+
+
+def play_through(engine, tracks, timeout):
+    """Plays tracks back to back through set_next(), returns the engine's events."""
+    events = []
+    engine.play(tracks[0])
+    upcoming = list(tracks[1:])
+    engine.set_next(upcoming.pop(0) if upcoming else None)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for event in engine.take_events():
+            events.append(event)
+            if event[0] == 'started' and event[4]:
+                engine.set_next(upcoming.pop(0) if upcoming else None)
+            if event[0] == 'finished' and event[1] == tracks[-1]:
+                return events
+        time.sleep(0.005)
+    raise TimeoutError("The engine didn't get through all tracks")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of each track")
+    parser.add_argument("--block-frames", type=int, default=2048)
+    parser.add_argument("--buffer-blocks", type=int, default=16)
+    parser.add_argument("--seeks", type=int, default=50)
+    parser.add_argument("--realtime", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracks = []
+        for i in range(args.tracks):
+            tracks.append(os.path.join(directory, f"track_{i}.wav"))
+            write_tone(tracks[-1], args.seconds, 1000 * (i + 1))
+
+        sink_path = os.path.join(directory, "sink.wav")
+        output = WavFileOutput(sink_path, realtime=args.realtime)
+        engine = PlaybackEngine(output, SAMPLE_RATE, 2, args.block_frames, args.buffer_blocks)
+        engine.start()
+        start = time.perf_counter()
+        events = play_through(engine, tracks, timeout=args.tracks * args.seconds * 2 + 10)
+        elapsed = time.perf_counter() - start
+        metrics = engine.metrics.snapshot(SAMPLE_RATE)
+        engine.close()
+        with wave.open(sink_path, 'rb') as f:
+            frames_written = f.getnframes()
+
+        gapless = sum(1 for event in events if event[0] == 'started' and event[4])
+        expected_frames = args.tracks * int(args.seconds * SAMPLE_RATE)
+        print(f"audio            {metrics['audio_seconds']:8.1f} s in {elapsed:.2f} s")
+        print(f"decode cpu       {metrics['decode_cpu_per_second'] * 100:8.3f} % of a core per second of audio")
+        print(f"output cpu       {metrics['output_cpu_per_second'] * 100:8.3f} % of a core per second of audio")
+        print(f"start latency    {metrics['max_latency'] * 1000:8.3f} ms")
+        print(f"underruns        {metrics['underruns']:8d}")
+        print(f"gapless handover {gapless:8d} of {args.tracks - 1}")
+        print(f"frames in sink   {frames_written} (expected {expected_frames})")
+
+        engine = PlaybackEngine(NullOutput(realtime=True), SAMPLE_RATE, 2, args.block_frames, args.buffer_blocks)
+        engine.start()
+        engine.play(tracks[0])
+        latencies = []
+        for i in range(args.seeks):
+            time.sleep(0.02)
+            engine.seek((i * 7.3) % args.seconds)
+            while engine.metrics.last_latency is None:
+                time.sleep(0.0005)
+            latencies.append(engine.metrics.last_latency)
+            engine.metrics.last_latency = None
+        engine.close()
+        latencies.sort()
+        print(f"seek latency     {latencies[len(latencies) // 2] * 1000:8.3f} ms median, "
+              f"{latencies[-1] * 1000:.3f} ms worst over {args.seeks} seeks")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Plays recorded per second by FavoritesManager, against the JSON-rewriting version it replaced.
+
+    python -m benchmarks.bench_favorites --plays 5000 --tracks 20000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from core.app_store import AppDataStore
+from core.favorites_manager import FavoritesManager
+
+
+class LegacyFavoritesManager:
+    """The original implementation: two full JSON dumps and a Counter rebuild per play."""
+
+    def __init__(self, data_file, max_size=20):
+        self.data_file = data_file
+        self.max_size = max_size
+        self.play_counts = Counter()
+
+    def _save_favorites(self):
+        with open(self.data_file, 'w') as f:
+            json.dump({'favorites': dict(self.play_counts)}, f, indent=4)
+
+    def add_to_favorites(self, song_filepath):
+        self.play_counts[song_filepath] += 1
+        self._save_favorites()
+        most_common = self.play_counts.most_common(self.max_size)
+        self.play_counts = Counter(dict(most_common))
+        self._save_favorites()
+
+
+def run(manager, plays):
+    start = time.perf_counter()
+    for filepath in plays:
+        manager.add_to_favorites(filepath)
+    if hasattr(manager, 'flush'):
+        manager.flush()
+    return len(plays) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plays", type=int, default=5000)
+    parser.add_argument("--tracks", type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    # Skewed towards a few songs, like real listening
+    plays = [f"/music/track_{int(rng.paretovariate(1.2)) % args.tracks}.mp3" for _ in range(args.plays)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = LegacyFavoritesManager(os.path.join(directory, "legacy.json"))
+        print(f"legacy     {run(legacy, plays):12.0f} plays/s")
+        data_file = os.path.join(directory, "app_data.json")
+        manager = FavoritesManager(data_file, store=AppDataStore(os.path.join(directory, "app_data.db")))
+        print(f"in-memory  {run(manager, plays):12.0f} plays/s (including the final flush)")
+        manager.store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares serial and pooled library scan throughput on a generated corpus.
+
+    python -m benchmarks.bench_scan --files 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+from core.library_manager import LibraryManager
+
+
+def run_scan(music_dir, workers, executor):
+    with tempfile.TemporaryDirectory() as index_dir:
+        # A fresh index every run, so every file really gets parsed
+        manager = LibraryManager(music_dir, os.path.join(index_dir, "index.db"),
+                                 scan_workers=workers, scan_executor=executor)
+        start = time.perf_counter()
+        songs = manager.scan_library()
+        elapsed = time.perf_counter() - start
+        manager.index.close()
+    return len(songs), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--music-dir", help="scan an existing directory instead of a generated corpus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        music_dir = args.music_dir or corpus_dir
+        if not args.music_dir:
+            generate_corpus(corpus_dir, args.files)
+        for label, workers, executor in (("serial", 1, 'thread'),
+                                         (f"threads x{args.workers}", args.workers, 'thread'),
+                                         (f"processes x{args.workers}", args.workers, 'process')):
+            count, elapsed = run_scan(music_dir, workers, executor)
+            print(f"{label:<16} {count:>7} files  {elapsed:7.2f}s  {count / elapsed:9.0f} files/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Position accuracy and cost of AudioPlayer seeks over a run of consecutive skips.
+
+    python -m benchmarks.bench_seek --skips 100 --tolerance 0.05
+
+Plays a silent WAV file into a real-time null output (no sound card needed) and skips
+forwards and backwards at random. The expected position is accumulated independently
+(skip amounts plus wall-clock time since play) and compared with the player's after every
+skip. Exits non-zero when the player is ever further off than the tolerance.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+
+from core.audio_output import NullOutput
+from core.audio_player import AudioPlayer
+
+
+def write_silence(filepath, seconds, rate=44100):
+    with wave.open(filepath, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b'\0\0\0\0' * int(seconds * rate))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skips", type=int, default=100)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="seconds")
+    parser.add_argument("--length", type=float, default=300.0, help="length of the test track in seconds")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "silence.wav")
+        write_silence(filepath, args.length)
+        player = AudioPlayer(output=NullOutput(realtime=True))
+        player.load(filepath)
+        player.play()
+        length = player.get_track_length() or args.length
+
+        seek_offset, seek_started = 0.0, time.monotonic()
+        worst_error = 0.0
+        seek_times = []
+        for _ in range(args.skips):
+            time.sleep(rng.uniform(0.0, 0.05))
+            expected = min(seek_offset + time.monotonic() - seek_started, length)
+            seconds = rng.choice((5, 5, 5, -5, 10, -10))
+            start = time.perf_counter()
+            if seconds > 0:
+                player.skip_forward(seconds)
+            else:
+                player.skip_backward(-seconds)
+            seek_times.append(time.perf_counter() - start)
+            seek_offset, seek_started = max(0.0, min(expected + seconds, length)), time.monotonic()
+
+            error = abs(player.get_current_time() - seek_offset)
+            worst_error = max(worst_error, error)
+
+        player.stop()
+        player.close()
+
+    seek_times.sort()
+    print(f"skips            {args.skips}")
+    print(f"seek median      {seek_times[len(seek_times) // 2] * 1000:8.3f} ms")
+    print(f"seek worst       {seek_times[-1] * 1000:8.3f} ms")
+    print(f"position error   {worst_error * 1000:8.3f} ms worst (tolerance {args.tolerance * 1000:.0f} ms)")
+    if worst_error > args.tolerance:
+        print("FAILED: position drifted beyond the tolerance")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
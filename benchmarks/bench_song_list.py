@@ -0,0 +1,79 @@
+"""
+Populate time and resident memory of the main song list at 10k/50k/100k songs.
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_song_list
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_song_list --legacy   # one SongListItem widget per row
+
+Every size runs in its own interpreter so the RSS numbers don't leak into each other.
+"""
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import time
+
+SIZES = (10000, 50000, 100000)
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def make_songs(count):
+    return [{'title': f"Song {i}", 'artist': f"Artist {i % 97}", 'album': f"Album {i % 389}",
+             'release_date': datetime.date(1960 + i % 60, 1, 1), 'filepath': f"/music/{i}.mp3"}
+            for i in range(count)]
+
+
+def run(count, legacy):
+    from PyQt5.QtWidgets import QApplication, QListView, QListWidget, QListWidgetItem
+    from ui.components import SongListItem, SongListModel, SongItemDelegate
+
+    app = QApplication(sys.argv)
+    songs = make_songs(count)
+    app.processEvents()
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    if legacy:
+        view = QListWidget()
+        for song in songs:
+            item = SongListItem(song)
+            list_item = QListWidgetItem()
+            list_item.setSizeHint(item.sizeHint())
+            view.addItem(list_item)
+            view.setItemWidget(list_item, item)
+    else:
+        model = SongListModel()
+        view = QListView()
+        view.setModel(model)
+        view.setItemDelegate(SongItemDelegate(view))
+        view.setUniformItemSizes(True)
+        model.set_songs(songs)
+    view.resize(600, 800)
+    view.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    print(f"{'legacy' if legacy else 'model':<7} {count:>7} songs  populate {elapsed:7.3f}s  "
+          f"rss +{rss_mb() - baseline:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run(args.run, args.legacy)
+        return
+    for count in SIZES:
+        command = [sys.executable, "-m", "benchmarks.bench_song_list", "--run", str(count)]
+        if args.legacy:
+            command.append("--legacy")
+        subprocess.run(command, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Memory per track of the columnar SongStore versus the per-song dicts it replaced.
+
+    python -m benchmarks.bench_song_store --songs 100000
+"""
+import argparse
+import datetime
+import tracemalloc
+
+from core.song_store import SongStore
+
+
+def song_infos(count):
+    for i in range(count):
+        # Fresh string objects every time, the way tags come out of mutagen
+        yield {'title': f"Song {i}", 'artist': "Artist %d" % (i % 97), 'album': "Album %d" % (i % 389),
+               'release_date': datetime.date(1960 + i % 60, 1, 1),
+               'filepath': f"/music/Artist {i % 97}/Album {i % 389}/track_{i:06d}.mp3"}
+
+
+def measure(build, count):
+    tracemalloc.start()
+    container = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, size
+
+
+def build_dicts(count):
+    return {info['filepath']: info for info in song_infos(count)}
+
+
+def build_store(count):
+    store = SongStore()
+    for info in song_infos(count):
+        store.add(info)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=100000)
+    args = parser.parse_args()
+    for label, build in (("dicts", build_dicts), ("SongStore", build_store)):
+        _, size = measure(build, args.songs)
+        print(f"{label:<10} {size / (1024 * 1024):8.1f} MB  {size / args.songs:7.0f} bytes/track")
+
+
+if __name__ == '__main__':
+    main()
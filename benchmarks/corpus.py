@@ -0,0 +1,29 @@
+import os
+import random
+
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, TDRC
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz), enough for mutagen to accept the file
+SILENT_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+
+def generate_corpus(directory, count, frames_per_file=40, seed=0):
+    """Writes `count` small tagged mp3 files spread over artist/album folders, returns their paths."""
+    rng = random.Random(seed)
+    filepaths = []
+    for i in range(count):
+        artist = f"Artist {i % 97}"
+        album = f"Album {i % 389}"
+        album_dir = os.path.join(directory, artist, album)
+        os.makedirs(album_dir, exist_ok=True)
+        filepath = os.path.join(album_dir, f"track_{i:06d}.mp3")
+        with open(filepath, 'wb') as f:
+            f.write(SILENT_FRAME * frames_per_file)
+        tags = ID3()
+        tags.add(TIT2(encoding=3, text=f"Song {rng.randrange(10 ** 6)} {i}"))
+        tags.add(TPE1(encoding=3, text=artist))
+        tags.add(TALB(encoding=3, text=album))
+        tags.add(TDRC(encoding=3, text=str(1960 + i % 60)))
+        tags.save(filepath)
+        filepaths.append(filepath)
+    return filepaths
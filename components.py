@@ -1,6 +1,6 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QStyledItemDelegate, QStyle
+from PyQt5.QtCore import Qt, QSize, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QFont, QFontMetrics, QColor
 
 class SongListItem(QWidget):
     def __init__(self, song_info, parent=None):
@@ -46,3 +46,100 @@ class SongListItem(QWidget):
     def sizeHint(self):
         # Return the minimum size required by the layout
         return QSize(self.minimumWidth, self.minimum_height)  # Corrected spelling here too
+
+
+class SongListModel(QAbstractListModel):
+    """
+    List model over a sequence of song dicts, rows are only materialised by the view when painted.
+    Use song_at() to get a row's song, going through QVariant would convert the dict.
+    """
+
+    def __init__(self, songs=None, parent=None):
+        super().__init__(parent)
+        self._songs = songs if songs is not None else []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._songs)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._songs):
+            return None
+        song = self._songs[index.row()]
+        if role == Qt.DisplayRole:
+            return song['title']
+        return None
+
+    def song_at(self, row):
+        return self._songs[row]
+
+    def songs(self):
+        return self._songs
+
+    def set_songs(self, songs):
+        self.beginResetModel()
+        self._songs = songs  # Any sequence, library views are used as they are
+        self.endResetModel()
+
+    def append_songs(self, songs):
+        if not songs:
+            return
+        if not isinstance(self._songs, list):
+            self._songs = list(self._songs)
+        first = len(self._songs)
+        self.beginInsertRows(QModelIndex(), first, first + len(songs) - 1)
+        self._songs.extend(songs)
+        self.endInsertRows()
+
+
+class SongItemDelegate(QStyledItemDelegate):
+    """
+    Paints a song row (title and artist on top, album below) the way SongListItem lays it out,
+    without creating any widgets.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.title_font = QFont("Arial", 12, QFont.Bold)
+        self.artist_font = QFont("Arial", 10)
+        self.album_font = QFont("Arial", 10, italic=True)
+        self.title_metrics = QFontMetrics(self.title_font)
+        self.artist_metrics = QFontMetrics(self.artist_font)
+        self.album_metrics = QFontMetrics(self.album_font)
+        self.row_height = 5 + self.title_metrics.height() + 4 + self.album_metrics.height() + 5
+
+    def paint(self, painter, option, index):
+        if not index.isValid():
+            return
+        song = index.model().song_at(index.row())
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, QColor("#460060"))
+        elif option.state & QStyle.State_MouseOver:
+            painter.fillRect(option.rect, QColor("#320046"))
+        else:
+            painter.fillRect(option.rect, QColor("#1E0028"))
+
+        rect = option.rect.adjusted(10, 5, -10, -5)
+        title_metrics = self.title_metrics
+        title = title_metrics.elidedText(song['title'], Qt.ElideRight, rect.width() * 2 // 3)
+        painter.setFont(self.title_font)
+        painter.setPen(QColor("#FFFFFF"))
+        painter.drawText(rect.x(), rect.y() + title_metrics.ascent(), title)
+
+        title_width = title_metrics.horizontalAdvance(title) + 10
+        artist_metrics = self.artist_metrics
+        artist = artist_metrics.elidedText(song['artist'], Qt.ElideRight, max(0, rect.width() - title_width))
+        painter.setFont(self.artist_font)
+        painter.setPen(QColor("#EEEEEE"))
+        painter.drawText(rect.x() + title_width, rect.y() + title_metrics.ascent(), artist)
+
+        album_metrics = self.album_metrics
+        album = album_metrics.elidedText(song['album'], Qt.ElideRight, rect.width())
+        painter.setFont(self.album_font)
+        painter.setPen(QColor("#CCCCCC"))
+        painter.drawText(rect.x(), rect.y() + title_metrics.height() + 4 + album_metrics.ascent(), album)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.row_height)
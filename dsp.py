@@ -0,0 +1,292 @@
+import math
+
+import numpy as np
+
+try:
+    from scipy.signal import sosfilt
+except ImportError:  # The equalizer falls back to an FFT convolution with the filters' impulse response
+    sosfilt = None
+
+PCM_SCALE = 32768.0
+
+
+def biquad(kind, frequency, gain_db, q, sample_rate):
+    """
+    Coefficients (b0, b1, b2, a0, a1, a2), normalised so a0 is 1, of an RBJ cookbook
+    'peak', 'lowshelf' or 'highshelf' filter.
+    """
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * frequency / sample_rate
+    cos_w0 = math.cos(w0)
+    alpha = math.sin(w0) / (2 * q)
+    if kind == 'peak':
+        b = (1 + alpha * a, -2 * cos_w0, 1 - alpha * a)
+        den = (1 + alpha / a, -2 * cos_w0, 1 - alpha / a)
+    elif kind in ('lowshelf', 'highshelf'):
+        sign = 1 if kind == 'lowshelf' else -1
+        root = 2 * math.sqrt(a) * alpha
+        b = (a * ((a + 1) - sign * (a - 1) * cos_w0 + root),
+             sign * 2 * a * ((a - 1) - sign * (a + 1) * cos_w0),
+             a * ((a + 1) - sign * (a - 1) * cos_w0 - root))
+        den = ((a + 1) + sign * (a - 1) * cos_w0 + root,
+               -sign * 2 * ((a - 1) + sign * (a + 1) * cos_w0),
+               (a + 1) + sign * (a - 1) * cos_w0 - root)
+    else:
+        raise ValueError(f"Unknown filter kind: {kind}")
+    return tuple(value / den[0] for value in b) + (1.0,) + tuple(value / den[0] for value in den[1:])
+
+
+class GainRamp:
+    """
+    Volume as a per-sample ramp: a new gain is reached over ramp_seconds instead of
+    jumping between two samples, which is what makes abrupt volume changes click.
+    The ramp is a straight line from the gain at set_gain() to the target, however the
+    blocks are cut, and lands on the target exactly.
+    """
+
+    def __init__(self, sample_rate, gain=1.0, ramp_seconds=0.03):
+        self.gain = gain
+        self.target = gain
+        self.ramp_frames = max(1, int(ramp_seconds * sample_rate))
+        self._start = gain
+        self._remaining = 0  # Frames left until the ramp reaches target
+        self._steps = np.empty(0, dtype=np.float32)  # 1, 2, 3... grown to the largest block seen
+        self._gains = np.empty(0, dtype=np.float32)
+
+    def set_gain(self, gain):
+        if gain == self.target:
+            return
+        self.target = gain
+        self._start = self.gain
+        self._remaining = self.ramp_frames
+
+    def process(self, samples):
+        if not self._remaining:
+            if self.gain != 1.0:
+                samples *= self.gain
+            return
+        frames = len(samples)
+        if len(self._steps) < frames:
+            self._steps = np.arange(1, frames + 1, dtype=np.float32)
+            self._gains = np.empty(frames, dtype=np.float32)
+        ramp = min(frames, self._remaining)
+        done = self.ramp_frames - self._remaining
+        step = (self.target - self._start) / self.ramp_frames
+        gains = self._gains[:frames]
+        np.add(self._steps[:frames], done, out=gains)
+        gains *= step
+        gains += self._start
+        gains[ramp:] = self.target
+        self._remaining -= ramp
+        if self._remaining:
+            self.gain = self._start + step * (done + ramp)
+        else:
+            self.gain = self.target
+        samples *= gains[:, None]
+
+
+class SosFilter:
+    """
+    Streams float (frames, channels) blocks through a cascade of biquad sections, rows of
+    (b0, b1, b2, a0, a1, a2) as returned by biquad().
+
+    With SciPy the filters run as real IIR sections (sosfilt). Without it the cascade's
+    impulse response, truncated to taps samples, is applied by FFT overlap-add, which is
+    indistinguishable for the gentle, low-Q curves of a music player.
+    """
+
+    def __init__(self, channels, sections=(), taps=1024):
+        self.channels = channels
+        self.taps = taps
+        self.set_sections(sections)
+
+    def set_sections(self, sections):
+        self._sos = np.array(sections, dtype=np.float64).reshape(-1, 6)
+        self._zi = np.zeros((len(self._sos), 2, self.channels))
+        self._response = None
+        self._tail = np.zeros((self.taps - 1, self.channels))
+        if len(self._sos) and sosfilt is None:
+            self._impulse = self._impulse_response()
+
+    def _impulse_response(self):
+        response = np.zeros(self.taps)
+        response[0] = 1.0
+        for b0, b1, b2, _, a1, a2 in self._sos:
+            x1 = x2 = y1 = y2 = 0.0
+            for i in range(self.taps):
+                x = response[i]
+                y = b0 * x + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+                x2, x1, y2, y1 = x1, x, y1, y
+                response[i] = y
+        return response
+
+    def process(self, samples):
+        if not len(self._sos):
+            return
+        if sosfilt is not None:
+            samples[:], self._zi = sosfilt(self._sos, samples, axis=0, zi=self._zi)
+            return
+        frames = len(samples)
+        size = 1 << (frames + self.taps - 2).bit_length()
+        if self._response is None or self._response[0] != size:
+            self._response = (size, np.fft.rfft(self._impulse, size)[:, None])
+        spectrum = np.fft.rfft(samples, size, axis=0)
+        spectrum *= self._response[1]
+        filtered = np.fft.irfft(spectrum, size, axis=0)
+        filtered[:self.taps - 1] += self._tail
+        self._tail[:] = filtered[frames:frames + self.taps - 1]
+        samples[:] = filtered[:frames]
+
+    def reset(self):
+        """Forgets the previous audio, after a seek or a new track."""
+        self._zi[:] = 0
+        self._tail[:] = 0
+
+
+class Equalizer(SosFilter):
+    """Cascade of biquad bands, e.g. [('lowshelf', 100, 3.0, 0.7), ('peak', 1000, -2.0, 1.0)]."""
+
+    def __init__(self, sample_rate, channels, bands=(), taps=1024):
+        self.sample_rate = sample_rate
+        self._pending_bands = None
+        super().__init__(channels, taps=taps)
+        self._apply_bands(bands)
+
+    def set_bands(self, bands):
+        """Takes effect from the next block, so it can be called while another thread is processing."""
+        self._pending_bands = list(bands)
+
+    def _apply_bands(self, bands):
+        self.bands = [band for band in bands if band[2] != 0]  # (kind, frequency, gain_db, q), flat bands do nothing
+        self.set_sections([biquad(kind, frequency, gain_db, q, self.sample_rate)
+                           for kind, frequency, gain_db, q in self.bands])
+
+    def process(self, samples):
+        if self._pending_bands is not None:
+            bands, self._pending_bands = self._pending_bands, None
+            self._apply_bands(bands)
+        super().process(samples)
+
+
+class TrackGain:
+    """
+    A fixed gain per track, e.g. ReplayGain: lookup(track) returns the linear gain for a
+    track, or None to leave it alone. The chain's set_track() switches it exactly where
+    the new track's audio starts.
+    """
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.gain = 1.0
+
+    def set_track(self, track):
+        gain = self.lookup(track) if track else None
+        self.gain = 1.0 if gain is None else gain
+
+    def process(self, samples):
+        if self.gain != 1.0:
+            samples *= self.gain
+
+
+class PcmTap:
+    """
+    Keeps a copy of the last frames that went through the chain in a preallocated ring,
+    for meters and visualizers. Readers look at ring and frames_written without locking:
+    a block being written while they read only shows up as a glitch in the picture.
+    buffer, if given, is the memory to keep the ring in, e.g. shared with another process.
+    """
+
+    def __init__(self, channels, frames=4096, buffer=None):
+        self.ring = np.ndarray((frames, channels), dtype=np.float32, buffer=buffer)
+        self.ring[:] = 0
+        self.frames_written = 0
+
+    def process(self, samples):
+        size = len(self.ring)
+        written = self.frames_written + len(samples)
+        samples = samples[-size:]
+        start = (written - len(samples)) % size
+        first = min(len(samples), size - start)
+        self.ring[start:start + first] = samples[:first]
+        self.ring[:len(samples) - first] = samples[first:]
+        self.frames_written = written
+
+    def reset(self):
+        self.ring[:] = 0
+
+
+class EqualPowerCrossfade:
+    """
+    Mixes the end of one track into the start of the next with cos/sin gain curves, so the
+    combined power stays level through the fade instead of dipping in the middle.
+    """
+
+    def __init__(self, sample_rate, seconds):
+        self.frames = max(1, int(seconds * sample_rate))
+        angles = np.linspace(0, math.pi / 2, self.frames, dtype=np.float32)
+        self._fade_out = np.cos(angles)[:, None]
+        self._fade_in = np.sin(angles)[:, None]
+
+    def mix(self, outgoing, incoming, offset):
+        """
+        Mixes two float (frames, channels) blocks, offset frames into the fade, into
+        incoming. Past the end of the fade incoming plays at full level.
+        """
+        frames = len(incoming)
+        fade_frames = max(0, min(frames, self.frames - offset))
+        if fade_frames:
+            incoming[:fade_frames] *= self._fade_in[offset:offset + fade_frames]
+            overlap = min(fade_frames, len(outgoing))
+            incoming[:overlap] += outgoing[:overlap] * self._fade_out[offset:offset + overlap]
+        return incoming
+
+    def mix_pcm(self, outgoing, incoming, offset, channels):
+        """mix() for 16-bit PCM blocks, returns the mixed block."""
+        incoming = np.frombuffer(incoming, dtype=np.int16).reshape(-1, channels) / PCM_SCALE
+        outgoing = np.frombuffer(outgoing, dtype=np.int16).reshape(-1, channels) / PCM_SCALE
+        return DspChain.to_pcm(self.mix(outgoing, incoming, offset))
+
+
+class DspChain:
+    """
+    Runs 16-bit PCM blocks through stages that work in place on float (frames, channels)
+    arrays: anything with a process(samples) method, e.g. Equalizer then GainRamp.
+    """
+
+    def __init__(self, channels, stages=()):
+        self.channels = channels
+        self.stages = list(stages)
+        self._samples = np.empty((0, channels), dtype=np.float32)
+
+    def to_float(self, data):
+        pcm = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+        if len(self._samples) < len(pcm):
+            self._samples = np.empty((len(pcm), self.channels), dtype=np.float32)
+        samples = self._samples[:len(pcm)]
+        np.multiply(pcm, 1 / PCM_SCALE, out=samples)
+        return samples
+
+    @staticmethod
+    def to_pcm(samples):
+        samples *= PCM_SCALE
+        np.clip(samples, -PCM_SCALE, PCM_SCALE - 1, out=samples)
+        return samples.astype(np.int16).tobytes()
+
+    def process(self, data):
+        if not self.stages or not data:
+            return data
+        samples = self.to_float(data)
+        for stage in self.stages:
+            stage.process(samples)
+        return self.to_pcm(samples)
+
+    def set_track(self, track):
+        """Called by the engine when the audio of another track starts."""
+        for stage in self.stages:
+            if hasattr(stage, 'set_track'):
+                stage.set_track(track)
+
+    def reset(self):
+        for stage in self.stages:
+            if hasattr(stage, 'reset'):
+                stage.reset()
@@ -1,45 +1,79 @@
-import json
-import os
-from collections import Counter
+import threading
+
+from core.app_store import AppDataStore
+from core.top_k import TopK
+from core.play_history import PlayHistory
 
 class FavoritesManager:
-    def __init__(self, data_file, max_size=20):
+    """
+    Play counts are recorded in memory (all counts plus a running top max_size) and written
+    to the store in one transaction flush_interval seconds after the first unsaved play,
+    or on flush()/close(). Every play also goes into the PlayHistory log, which ranks songs
+    by how much they were played lately (get_recent_favorites).
+    """
+
+    def __init__(self, data_file, max_size=20, store=None, flush_interval=5.0):
         self.data_file = data_file
         self.max_size = max_size
-        self.play_counts = self._load_favorites()
+        self.flush_interval = flush_interval
+        self.store = store or AppDataStore.shared(data_file)
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._flush_timer = None
+        self.top = TopK(max_size, self._load_favorites())
+        self.history = PlayHistory(self.store, top_size=max(max_size, 100))
+
+    @property
+    def play_counts(self):
+        """{song_filepath: play count} for every song that was ever played."""
+        return self.top.scores
 
     def _load_favorites(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as f:
-                try:
-                    data = json.load(f)
-                    return Counter(data.get('favorites', {}))
-                except json.JSONDecodeError:
-                    return Counter()
-        return Counter()
-
-    def _save_favorites(self):
-        data = {'favorites': dict(self.play_counts)}
-        with open(self.data_file, 'w') as f:
-            json.dump(data, f, indent=4)
-
-    def add_to_favorites(self, song_filepath):
-        self.play_counts[song_filepath] += 1
-        self._save_favorites()
-        self._sort_and_trim()
+        return dict(self.store.query("SELECT t.filepath, c.count FROM play_counts c JOIN tracks t ON t.id = c.track_id"))
+
+    def add_to_favorites(self, song_filepath, listened=None):
+        """Records a play, listened is how many seconds of the song were actually heard if known."""
+        with self._lock:
+            self.top.increment(song_filepath)
+            self.history.record(song_filepath, listened)
+            self._dirty.add(song_filepath)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
 
     def remove_from_favorites(self, song_filepath):
-        if song_filepath in self.play_counts:
-            del self.play_counts[song_filepath]
-            self._save_favorites()
+        with self._lock:
+            if self.top.remove(song_filepath):
+                self._dirty.add(song_filepath)
+            self.history.remove(song_filepath)
+
+    def flush(self):
+        """Writes the play counts that changed since the last flush."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            dirty, self._dirty = self._dirty, set()
+            if self.store.connection is None:
+                return
+            with self.store.transaction() as connection:
+                self.history.flush()
+                updated = [(self.store.track_id(filepath), self.play_counts[filepath])
+                           for filepath in dirty if filepath in self.play_counts]
+                removed = [(self.store.track_id(filepath),) for filepath in dirty if filepath not in self.play_counts]
+                connection.executemany("INSERT OR REPLACE INTO play_counts VALUES (?, ?)", updated)
+                connection.executemany("DELETE FROM play_counts WHERE track_id = ?", removed)
+
+    def close(self):
+        self.flush()
 
     def get_favorites(self):
-        return self.play_counts.most_common(self.max_size)
+        return self.top.most_common(self.max_size)
+
+    def get_recent_favorites(self, n=None):
+        """[(song_filepath, score), ...] ranked by time-decayed plays, so old obsessions fade out."""
+        return self.history.recent_favorites(n or self.max_size)
 
     def get_play_count(self, song_filepath):
         return self.play_counts.get(song_filepath, 0)
-
-    def _sort_and_trim(self):
-        most_common = self.play_counts.most_common(self.max_size)
-        self.play_counts = Counter(dict(most_common))
-        self._save_favorites()
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import datetime
+
+SCHEMA_VERSION = 2
+
+
+class LibraryIndex:
+    """
+    On-disk index of the music library, keyed by file path.
+
+    Every row remembers the (mtime, size, inode) of the file it was parsed
+    from, so a rescan only has to re-read files whose stat key changed.
+    Loudness measurements are kept in their own table, keyed by the (mtime, size) of the
+    file that was analysed, so they survive a rebuild of the tracks table. Files that
+    couldn't be parsed are kept the same way, so they aren't parsed again until they change.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        index_dir = os.path.dirname(index_file)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self.connection = sqlite3.connect(index_file, check_same_thread=False)
+        self._create_schema()
+
+    def _create_schema(self):
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # The index is only a cache of the music directory, rebuild it on format changes
+            self.connection.execute("DROP TABLE IF EXISTS tracks")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tracks (
+                filepath TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                release_year INTEGER,
+                duration REAL NOT NULL DEFAULT 0,
+                bitrate INTEGER NOT NULL DEFAULT 0,
+                sample_rate INTEGER NOT NULL DEFAULT 0,
+                channels INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS loudness (
+                filepath TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                loudness REAL,
+                peak REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS unreadable (
+                filepath TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.commit()
+
+    def load(self):
+        """
+        Return {filepath: (stat_key, song_info)} for every indexed track.
+        """
+        entries = {}
+        cursor = self.connection.execute(
+            "SELECT filepath, mtime_ns, size, inode, title, artist, album, release_year,"
+            " duration, bitrate, sample_rate, channels FROM tracks"
+        )
+        for (filepath, mtime_ns, size, inode, title, artist, album, release_year,
+             duration, bitrate, sample_rate, channels) in cursor:
+            release_date = datetime.date(release_year, 1, 1) if release_year else None
+            song_info = {'title': title, 'artist': artist, 'album': album,
+                         'release_date': release_date, 'filepath': filepath, 'duration': duration,
+                         'bitrate': bitrate, 'sample_rate': sample_rate, 'channels': channels}
+            entries[filepath] = ((mtime_ns, size, inode), song_info)
+        return entries
+
+    def update(self, entries):
+        """
+        Insert or replace tracks from an iterable of (stat_key, song_info) pairs.
+        """
+        rows = []
+        for (mtime_ns, size, inode), song_info in entries:
+            release_date = song_info.get('release_date')
+            rows.append((song_info['filepath'], mtime_ns, size, inode, song_info['title'],
+                         song_info['artist'], song_info['album'],
+                         release_date.year if release_date else None,
+                         song_info.get('duration', 0.0), song_info.get('bitrate', 0),
+                         song_info.get('sample_rate', 0), song_info.get('channels', 0)))
+        if rows:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self.connection.executemany("DELETE FROM unreadable WHERE filepath = ?", [row[:1] for row in rows])
+
+    def remove(self, filepaths):
+        rows = [(filepath,) for filepath in filepaths]
+        if rows:
+            with self.connection:
+                self.connection.executemany("DELETE FROM tracks WHERE filepath = ?", rows)
+                self.connection.executemany("DELETE FROM loudness WHERE filepath = ?", rows)
+                self.connection.executemany("DELETE FROM unreadable WHERE filepath = ?", rows)
+
+    def load_unreadable(self):
+        """
+        Return {filepath: (mtime_ns, size)} of the files that couldn't be parsed.
+        """
+        return {filepath: (mtime_ns, size) for filepath, mtime_ns, size
+                in self.connection.execute("SELECT filepath, mtime_ns, size FROM unreadable")}
+
+    def mark_unreadable(self, entries):
+        """
+        Remember files that couldn't be parsed, from an iterable of (filepath, stat_key).
+        """
+        rows = [(filepath, key[0], key[1]) for filepath, key in entries]
+        if rows:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO unreadable VALUES (?, ?, ?)", rows)
+
+    def load_loudness(self):
+        """
+        Return {filepath: (loudness, peak)} for indexed tracks that were analysed since they
+        last changed. loudness is in LUFS, None for silent tracks.
+        """
+        cursor = self.connection.execute(
+            "SELECT l.filepath, l.loudness, l.peak FROM loudness l JOIN tracks t"
+            " ON t.filepath = l.filepath AND t.mtime_ns = l.mtime_ns AND t.size = l.size"
+        )
+        return {filepath: (loudness, peak) for filepath, loudness, peak in cursor}
+
+    def unanalysed(self):
+        """
+        Return [(filepath, (mtime_ns, size))] for indexed tracks with no loudness
+        measurement of their current contents.
+        """
+        cursor = self.connection.execute(
+            "SELECT t.filepath, t.mtime_ns, t.size FROM tracks t LEFT JOIN loudness l ON t.filepath = l.filepath"
+            " WHERE l.filepath IS NULL OR l.mtime_ns != t.mtime_ns OR l.size != t.size"
+        )
+        return [(filepath, (mtime_ns, size)) for filepath, mtime_ns, size in cursor]
+
+    def update_loudness(self, entries):
+        """
+        Insert or replace loudness measurements from an iterable of
+        ((mtime_ns, size), filepath, loudness, peak).
+        """
+        rows = [(filepath, mtime_ns, size, loudness, peak) for (mtime_ns, size), filepath, loudness, peak in entries]
+        if rows:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self.connection.close()
@@ -1,73 +1,312 @@
 import os
 import mutagen
 import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from core.library_index import LibraryIndex
+from core.song_store import SongStore
+from core.search_index import SearchIndex
+from core.album_index import AlbumIndex
+
+try:
+    from core.loudness import analyze_file, init_worker, replay_gain
+except ImportError:  # NumPy missing, tracks play at their own loudness
+    analyze_file = None
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.wav', '.ogg') # Add more formats as needed
+
+
+def read_song_info(filepath):
+    """Parses the tags of a single audio file, returns None if it can't be read."""
+    try:
+        audio_info = mutagen.File(filepath)
+    except mutagen.MutagenError:
+        print(f"Error reading metadata from {filepath}")
+        return None
+    if audio_info is None:
+        print(f"Error reading metadata from {filepath}")
+        return None
+    title = audio_info.get('TIT2', [os.path.basename(filepath)])[0]
+    artist = audio_info.get('TPE1', ['Unknown Artist'])[0]
+    album = audio_info.get('TALB', ['Unknown Album'])[0]
+    release_date_str = audio_info.get('TDRC', [''])[0]
+    release_date = None
+    if release_date_str:
+        try:
+            release_date = datetime.datetime.strptime(str(release_date_str), '%Y').date()
+        except ValueError:
+            pass
+    info = audio_info.info
+    return {'title': str(title), 'artist': str(artist), 'album': str(album), 'release_date': release_date, 'filepath': filepath,
+            'duration': getattr(info, 'length', 0) or 0.0, 'bitrate': getattr(info, 'bitrate', 0) or 0,
+            'sample_rate': getattr(info, 'sample_rate', 0) or 0, 'channels': getattr(info, 'channels', 0) or 0}
+
+
+def stat_key(stat_result):
+    """The part of os.stat() that tells us whether a file needs to be re-parsed."""
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
 
 class LibraryManager:
-    def __init__(self, music_directory):
+    def __init__(self, music_directory, index_file=os.path.join("data", "library_index.db"),
+                 scan_workers=8, scan_executor='thread', analysis_workers=None):
         self.music_directory = music_directory
-        self.songs = {os.path.expanduser("~/Music")} # {filepath: {title, artist, album, release_date, filepath}}
-        self.albums = {os.path.expanduser("~/Music")} # {artist: {album_name: [filepaths]}}
+        self.index = LibraryIndex(index_file)
+        self.scan_workers = scan_workers # 1 parses on the calling thread
+        self.scan_executor = scan_executor # 'thread' for network shares, 'process' for CPU bound local disks
+        self.songs = SongStore() # {filepath: Song(title, artist, album, release_date, filepath, duration, ...)}
+        self.search_index = SearchIndex(self.songs)
+        self.album_index = AlbumIndex(self.songs)
+        # Decoding is CPU bound, leave a core for the UI and playback
+        self.analysis_workers = analysis_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.loudness = {} # {filepath: (loudness in LUFS or None, peak)} for analysed songs
+
+    def load_library(self):
+        """Fills the library from the on-disk index without touching any audio file."""
+        self.songs.clear()
+        for _, song_info in self.index.load().values():
+            self.songs.add(song_info)
+        self.loudness.clear()
+        self.loudness.update(self.index.load_loudness())
+        return self.songs.values()
 
     def scan_library(self):
-        self.songs = {}
-        for root, _, files in os.walk(self.music_directory):
-            for file in files:
-                if file.endswith(('.mp3', '.flac', '.wav', '.ogg')): # Add more formats as needed
-                    filepath = os.path.join(root, file)
-                    try:
-                        audio_info = mutagen.File(filepath)
-                        title = audio_info.get('TIT2', [file])[0]
-                        artist = audio_info.get('TPE1', ['Unknown Artist'])[0]
-                        album = audio_info.get('TALB', ['Unknown Album'])[0]
-                        release_date_str = audio_info.get('TDRC', [''])[0]
-                        release_date = None
-                        if release_date_str:
+        """Rescans the music directory, only re-parsing files that were added or changed."""
+        for batch in self.iter_scan_batches():
+            self.apply_scan_batch(batch)
+        return self.songs.values()
+
+    def iter_scan_batches(self, batch_size=500):
+        """
+        Rescans the music directory and yields (unchanged, updated, removed) batches as they
+        become available: song_infos that are in the index as they are on disk, song_infos
+        parsed just now, and filepaths that are gone or can no longer be read.
+
+        Only the on-disk index is written here, so this can run on a worker thread; the songs
+        change when the batches are handed to apply_scan_batch on the thread that owns them.
+        Files that couldn't be parsed are remembered with their mtime and size and skipped
+        until they change.
+        """
+        indexed = self.index.load()
+        unreadable = self.index.load_unreadable()
+        seen = set()
+        unchanged = []
+        pending = []
+        for filepath, key in self.walk_music_files():
+            seen.add(filepath)
+            entry = indexed.pop(filepath, None)
+            if entry is not None and entry[0] == key:
+                unchanged.append(entry[1])
+                if len(unchanged) >= batch_size:
+                    yield unchanged, [], []
+                    unchanged = []
+            elif unreadable.get(filepath) != key[:2]:
+                pending.append((filepath, key))
+        if unchanged:
+            yield unchanged, [], []
+        # Whatever is left in the index wasn't found on disk anymore
+        self.index.remove(list(indexed.keys()) + [filepath for filepath in unreadable if filepath not in seen])
+        removed = [filepath for filepath in self.songs.keys() if filepath not in seen]
+        if removed:
+            yield [], [], removed
+        for batch, failed in self._parse_files(pending, batch_size):
+            yield [], self._index_parsed(batch, failed), [filepath for filepath, _ in failed]
+
+    def _index_parsed(self, batch, failed):
+        self.index.update(batch)
+        # A file that can't be read anymore leaves the library until it changes again
+        self.index.remove([filepath for filepath, _ in failed])
+        self.index.mark_unreadable(failed)
+        return [song_info for _, song_info in batch]
+
+    def apply_scan_batch(self, batch):
+        """
+        Brings the songs in line with an (unchanged, updated, removed) batch from
+        iter_scan_batches, returns (songs found, filepaths removed). Meant for the UI thread.
+        """
+        unchanged, updated, removed = batch
+        songs = []
+        for song_info in unchanged:
+            track_id = self.songs.track_id(song_info['filepath'])
+            if track_id is None:
+                track_id = self.songs.add(song_info)
+            songs.append(self.songs.song(track_id))
+        for song_info in updated:
+            self.loudness.pop(song_info['filepath'], None)  # Measured on the old contents
+            songs.append(self.songs.song(self.songs.add(song_info)))
+        removed = [filepath for filepath in removed if self.songs.pop(filepath, None) is not None]
+        for filepath in removed:
+            self.loudness.pop(filepath, None)
+        return songs, removed
+
+    def _parse_files(self, pending, batch_size):
+        """
+        Runs read_song_info over (filepath, stat_key) pairs, yields batches of
+        ([(stat_key, song_info)], [(filepath, stat_key)] that couldn't be parsed).
+        """
+        filepaths = [filepath for filepath, _ in pending]
+        if self.scan_workers <= 1 or len(pending) < 2:
+            yield from self._batched(pending, map(read_song_info, filepaths), batch_size)
+            return
+        if self.scan_executor == 'process':
+            executor = ProcessPoolExecutor(max_workers=self.scan_workers)
+            chunksize = max(1, min(64, len(filepaths) // (self.scan_workers * 4)))
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.scan_workers)
+            chunksize = 1
+        try:
+            yield from self._batched(pending, executor.map(read_song_info, filepaths, chunksize=chunksize), batch_size)
+        finally:
+            # Don't keep parsing files nobody is waiting for when the scan gets cancelled
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _batched(pending, results, batch_size):
+        batch = []
+        failed = []
+        for (filepath, key), song_info in zip(pending, results):
+            if song_info is None:
+                failed.append((filepath, key))
+            else:
+                batch.append((key, song_info))
+            if len(batch) + len(failed) >= batch_size:
+                yield batch, failed
+                batch = []
+                failed = []
+        if batch or failed:
+            yield batch, failed
+
+    def walk_music_files(self, directory=None):
+        """Yields (filepath, stat_key) for every audio file below directory (the music directory by default)."""
+        pending = [directory or self.music_directory]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
                             try:
-                                release_date = datetime.datetime.strptime(str(release_date_str), '%Y').date()
-                            except ValueError:
+                                yield entry.path, stat_key(entry.stat())
+                            except OSError:
                                 pass
-                        self.songs[filepath] = {'title': str(title), 'artist': str(artist), 'album': str(album), 'release_date': release_date, 'filepath': filepath}
-                    except mutagen.MutagenError:
-                        print(f"Error reading metadata from {filepath}")
-        self._create_albums()
-        return list(self.songs.values())
-
-    def _create_albums(self):
-        self.albums = {}
-        for song_info in self.songs.values():
-            artist = song_info['artist']
-            album = song_info['album']
-            filepath = song_info['filepath']
-            if artist not in self.albums:
-                self.albums[artist] = {}
-            if album not in self.albums[artist]:
-                self.albums[artist][album] = []
-            self.albums[artist][album].append(filepath)
-        for artist_albums in self.albums.values():
-            for album_files in artist_albums.values():
-                album_files.sort(key=lambda fp: self.songs[fp].get('release_date') or datetime.date.min)
+            except OSError as e:
+                print(f"Error scanning {directory}: {e}")
+
+    def apply_changes(self, changed_paths, removed_paths):
+        """
+        Applies a batch of file system changes without rescanning everything.
+        Returns (songs added or updated, filepaths removed).
+        """
+        return self.apply_scan_batch(self.read_changes(changed_paths, removed_paths))
+
+    def read_changes(self, changed_paths, removed_paths):
+        """
+        Parses and indexes changed files like iter_scan_batches, but only the ones given.
+        Returns an ([], updated, removed) batch for apply_scan_batch.
+        """
+        pending = []
+        for filepath in changed_paths:
+            try:
+                pending.append((filepath, stat_key(os.stat(filepath))))
+            except OSError:
+                pass # Gone again before we got to it
+        updated = []
+        removed = list(removed_paths)
+        for batch, failed in self._parse_files(pending, 500):
+            updated.extend(self._index_parsed(batch, failed))
+            removed.extend(filepath for filepath, _ in failed)
+        self.index.remove(removed_paths)
+        return [], updated, removed
+
+    def iter_loudness_analysis(self, batch_size=20):
+        """
+        Measures the loudness of every song that wasn't analysed since it last changed, in a
+        process pool, and yields the filepaths done in batches. Results are stored in the
+        index as they come in, so a cancelled analysis picks up where it stopped next time.
+        Files that can't be decoded are stored as silent and not retried until they change.
+        """
+        if analyze_file is None:
+            print("Loudness analysis needs NumPy")
+            return
+        pending = self.index.unanalysed()
+        if not pending:
+            return
+        filepaths = [filepath for filepath, _ in pending]
+        if self.analysis_workers <= 1 or len(pending) < 2:
+            yield from self._store_loudness(pending, map(analyze_file, filepaths), batch_size)
+            return
+        executor = ProcessPoolExecutor(max_workers=self.analysis_workers, initializer=init_worker)
+        try:
+            # One track at a time, decoding a track takes long enough to make the round trip cheap
+            yield from self._store_loudness(pending, executor.map(analyze_file, filepaths), batch_size)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _store_loudness(self, pending, results, batch_size):
+        batch = []
+        for (filepath, key), result in zip(pending, results):
+            loudness, peak = result[1:] if result is not None else (None, 0.0)
+            batch.append((key, filepath, loudness, peak))
+            if len(batch) >= batch_size:
+                yield self._save_loudness(batch)
+                batch = []
+        if batch:
+            yield self._save_loudness(batch)
+
+    def _save_loudness(self, batch):
+        self.index.update_loudness(batch)
+        for _, filepath, loudness, peak in batch:
+            self.loudness[filepath] = (loudness, peak)
+        return [filepath for _, filepath, _, _ in batch]
+
+    def track_gain(self, filepath):
+        """Linear ReplayGain for a song, None if it wasn't analysed (yet) or is silent."""
+        entry = self.loudness.get(filepath)
+        if entry is None or analyze_file is None:
+            return None
+        return replay_gain(*entry)
 
     def delete_song(self, filepath):
         if filepath in self.songs:
             del self.songs[filepath]
+            self.index.remove([filepath])
             try:
                 os.remove(filepath)
-                self._create_albums() # Re-scan albums after deletion
                 return True
             except OSError as e:
                 print(f"Error deleting {filepath}: {e}")
                 return False
         return False
 
+    @property
+    def albums(self):
+        """{artist: {album_name: [filepaths]}}, maintained incrementally by the album index."""
+        return self.album_index.albums
+
     def get_all_songs(self):
-        return list(self.songs.values())
+        return self.songs.values()
 
     def sort_songs(self, song_list, sort_by, ascending=True):
-        if sort_by == 'name':
-            return sorted(song_list, key=lambda song: song['title'].lower(), reverse=not ascending)
-        elif sort_by == 'date':
-            return sorted(song_list, key=lambda song: song.get('release_date') or datetime.date.min, reverse=not ascending)
-        return song_list
+        """Orders song_list by 'name', 'date', 'artist' or 'album' using the store's sort indexes."""
+        if sort_by not in self.songs.sort_indexes:
+            return song_list
+        if self.songs.is_library_view(song_list):
+            return self.songs.sorted_view(sort_by, ascending)  # Already in the index's order
+        songs = self.songs
+        with songs.lock:
+            ranks = songs.sort_indexes[sort_by].ranks()
+            track_ids = [songs.track_id(song['filepath']) for song in song_list]
+        # Songs the library doesn't know (anymore) keep their order after the rest, duplicates stay
+        sign = 1 if ascending else -1
+        keys = [(0, sign * ranks[track_id]) if track_id is not None else (1, 0) for track_id in track_ids]
+        order = sorted(range(len(song_list)), key=keys.__getitem__)
+        return [song_list[i] for i in order]
+
+    def search(self, query, limit=None):
+        """Songs whose title, artist, album or path match every word of query (prefix or fuzzy), by title."""
+        return self.search_index.search(query, limit)
 
     def get_albums_by_artist(self, artist):
-        return self.albums.get(artist, {})
+        return self.album_index.artist_albums(artist)
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+from core.library_manager import AUDIO_EXTENSIONS
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # Fall back to polling mtime snapshots
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self.watcher.queue_change(event.src_path, is_directory=event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.queue_change(event.src_path)
+
+    def on_deleted(self, event):
+        self.watcher.queue_removal(event.src_path, is_directory=event.is_directory)
+
+    def on_moved(self, event):
+        self.watcher.queue_removal(event.src_path, is_directory=event.is_directory)
+        self.watcher.queue_change(event.dest_path, is_directory=event.is_directory)
+
+
+class LibraryWatcher:
+    """
+    Watches the music directory and reads changes into the LibraryManager's index incrementally.
+
+    Events are coalesced per path and flushed once things have been quiet for `debounce`
+    seconds (but at least every `max_delay` seconds), so copying a whole folder of songs
+    results in a single call to on_change(batch). on_change is called from the watcher's
+    thread and should hand the batch to LibraryManager.apply_scan_batch on the UI thread.
+
+    Without watchdog the tree is polled, every `poll_interval` seconds at first and less
+    often while nothing changes, up to every `max_poll_interval` seconds.
+    """
+
+    def __init__(self, library_manager, on_change, debounce=1.0, max_delay=5.0, poll_interval=5.0,
+                 max_poll_interval=60.0):
+        self.library_manager = library_manager
+        self.on_change = on_change
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Held while a flush runs, stop() waits on it
+        self._pending = {}  # {path: (removed, is_directory)}, the last event for a path wins
+        self._timer = None
+        self._first_event_at = None
+        self._observer = None
+        self._poll_thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._stop_event.clear()
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_WatchdogHandler(self), self.library_manager.music_directory, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(target=self._poll, daemon=True)
+            self._poll_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._poll_thread is not None:
+            self._poll_thread.join()
+            self._poll_thread = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
+        with self._flush_lock:
+            pass  # A flush that was already running has finished now
+
+    def queue_change(self, path, is_directory=False):
+        if is_directory or path.lower().endswith(AUDIO_EXTENSIONS):
+            self._queue(path, False, is_directory)
+
+    def queue_removal(self, path, is_directory=False):
+        if is_directory or path.lower().endswith(AUDIO_EXTENSIONS):
+            self._queue(path, True, is_directory)
+
+    def _queue(self, path, removed, is_directory):
+        now = time.monotonic()
+        with self._lock:
+            self._pending[path] = (removed, is_directory)
+            if self._first_event_at is None:
+                self._first_event_at = now
+            if self._timer is not None:
+                self._timer.cancel()
+            # Keep pushing the flush back while events keep coming, but not forever
+            delay = min(self.debounce, max(0.0, self._first_event_at + self.max_delay - now))
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._flush_lock:
+            if not self._stop_event.is_set():
+                self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+            self._first_event_at = None
+        if not pending:
+            return
+        changed = set()
+        removed = set()
+        songs = self.library_manager.songs
+        for path, (is_removal, is_directory) in pending.items():
+            if is_directory:
+                if is_removal:
+                    prefix = os.path.join(path, "")
+                    removed.update(filepath for filepath in songs.keys() if filepath.startswith(prefix))
+                else:
+                    changed.update(filepath for filepath, _ in self.library_manager.walk_music_files(path))
+            elif is_removal or not os.path.exists(path):
+                removed.add(path)
+            else:
+                changed.add(path)
+        removed -= changed
+        batch = self.library_manager.read_changes(sorted(changed), sorted(removed))
+        if batch[1] or batch[2]:
+            self.on_change(batch)
+
+    def _poll(self):
+        snapshot = dict(self.library_manager.walk_music_files())
+        interval = self.poll_interval
+        while not self._stop_event.wait(interval):
+            current = dict(self.library_manager.walk_music_files())
+            changed = False
+            for filepath, key in current.items():
+                if snapshot.get(filepath) != key:
+                    self.queue_change(filepath)
+                    changed = True
+            for filepath in snapshot.keys() - current.keys():
+                self.queue_removal(filepath)
+                changed = True
+            snapshot = current
+            # A library that sits still is walked less and less often, a change brings it back
+            interval = self.poll_interval if changed else min(interval * 2, self.max_poll_interval)
@@ -0,0 +1,107 @@
+import math
+import os
+
+import numpy as np
+
+from core.dsp import DspChain, SosFilter
+from core.playback_engine import open_decoder
+
+REFERENCE_LOUDNESS = -18.0  # LUFS, what ReplayGain 2.0 brings every track to
+ABSOLUTE_GATE = -70.0  # LUFS, blocks quieter than this are silence
+RELATIVE_GATE = -10.0  # LU below the loudness of the blocks above the absolute gate
+
+
+def k_weighting(sample_rate):
+    """
+    The ITU-R BS.1770 K-weighting filter as biquad sections for any sample rate: a high
+    shelf for the acoustics of the head, then a high pass. At 48kHz these are the
+    coefficients printed in the standard.
+    """
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = (1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    return [shelf, high_pass]
+
+
+def _block_loudness(power):
+    with np.errstate(divide='ignore'):
+        return -0.691 + 10 * np.log10(power)
+
+
+def integrated_loudness(step_energy, step_frames):
+    """
+    EBU R128 integrated loudness in LUFS from the K-weighted energy (sum of squares) of
+    each channel over consecutive 100ms steps, shape (steps, channels). Gating blocks are
+    400ms long and overlap by 75%, i.e. four steps moved one step at a time.
+    Returns None for silence.
+    """
+    if len(step_energy) < 4:
+        return None
+    blocks = step_energy[:-3] + step_energy[1:-2] + step_energy[2:-1] + step_energy[3:]
+    power = blocks.sum(axis=1) / (4 * step_frames)  # Left and right weigh 1.0
+    power = power[_block_loudness(power) > ABSOLUTE_GATE]
+    if not len(power):
+        return None
+    threshold = _block_loudness(power.mean()) + RELATIVE_GATE
+    power = power[_block_loudness(power) > threshold]
+    return float(_block_loudness(power.mean()))
+
+
+def analyze_file(filepath, sample_rate=44100, channels=2, chunk_seconds=10):
+    """
+    Decodes a track and measures it, returns (filepath, loudness in LUFS or None for
+    silence, sample peak from 0 to 1), or None if it can't be decoded.
+    Runs in the analysis processes, so it only takes and returns plain values.
+    """
+    try:
+        decoder = open_decoder(filepath, sample_rate, channels)
+    except Exception as e:
+        print(f"Error decoding {filepath} for loudness analysis: {e}")
+        return None
+    step_frames = sample_rate // 10
+    chain = DspChain(channels)
+    weighting = SosFilter(channels, k_weighting(sample_rate), taps=4096)
+    energies = []
+    peak = 0
+    try:
+        while True:
+            data = decoder.read(step_frames * chunk_seconds * 10)
+            if not data:
+                break
+            pcm = np.frombuffer(data, dtype=np.int16)
+            peak = max(peak, int(np.abs(pcm, dtype=np.int32).max(initial=0)))  # abs(-32768) overflows int16
+            samples = chain.to_float(data)
+            weighting.process(samples)
+            steps = len(samples) // step_frames  # A last partial step (<100ms) is left out
+            squared = np.square(samples[:steps * step_frames], dtype=np.float64)
+            energies.append(squared.reshape(steps, step_frames, channels).sum(axis=1))
+    except Exception as e:
+        print(f"Error decoding {filepath} for loudness analysis: {e}")
+        return None
+    finally:
+        decoder.close()
+    step_energy = np.concatenate(energies) if energies else np.zeros((0, channels))
+    return filepath, integrated_loudness(step_energy, step_frames), peak / 32768.0
+
+
+def replay_gain(loudness, peak, reference=REFERENCE_LOUDNESS):
+    """Linear gain that brings a track to reference, lowered if it would push the peak into clipping."""
+    if loudness is None:
+        return None
+    gain = 10 ** ((reference - loudness) / 20)
+    if peak > 0:
+        gain = min(gain, 1.0 / peak)
+    return gain
+
+
+def init_worker():
+    # The analysis processes decode only, they mustn't grab the sound card
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
@@ -1,15 +1,20 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QListWidget, QLabel, QPushButton, QSpacerItem,
+                             QListView, QLabel, QPushButton, QSpacerItem, QLineEdit,
                              QSizePolicy, QStackedWidget, QInputDialog,
-                             QMessageBox, QToolBar, QAction, QListWidgetItem)
+                             QMessageBox, QToolBar, QAction, QMenu)
 from PyQt5.QtGui import QPixmap, QIcon, QColor, QPalette, QPainter, QFont
-from PyQt5.QtCore import Qt, QTimer, QSize
+from PyQt5.QtCore import Qt, QTimer, QSize, pyqtSignal
 
 from ui.playlists_page import PlaylistsPage
 from ui.albums_page import AlbumsPage
 from ui.favorites_page import FavoritesPage
-from ui.components import SongListItem
+from ui.components import SongListModel, SongItemDelegate
+from ui.scan_worker import LibraryScanWorker, LoudnessWorker
+from ui.album_art import AlbumArtCache
+from ui.visualizer import SpectrumWidget
+from core.library_watcher import LibraryWatcher
 from core.audio_player import AudioPlayer
+from core.play_queue import PlayQueue, REPEAT_MODES
 from core.library_manager import LibraryManager
 from core.playlist_manager import PlaylistManager
 from core.favorites_manager import FavoritesManager
@@ -17,12 +22,24 @@ from voice.commands import CommandHandler
 from voice.voice_assistant import VoiceAssistant
 import pygame
 
+try:
+    from core.spectrum import SpectrumAnalyzer
+except ImportError:  # NumPy missing, the playback bar goes without a visualizer
+    SpectrumAnalyzer = None
+
 class MainWindow(QMainWindow):
+    library_changed = pyqtSignal(object)  # A batch read by the watcher, see LibraryManager.read_changes
+
     def __init__(self, library_manager, playlist_manager, audio_player, favorites_manager):
         super().__init__()
         self.library_manager = library_manager
+        # The watcher reports from its own thread, the signal hands the changes over to the UI thread
+        self.library_watcher = LibraryWatcher(library_manager, self.library_changed.emit)
+        self.library_changed.connect(self._on_library_changed)
         self.playlist_manager = playlist_manager
         self.audio_player = audio_player
+        self.audio_player.songs = library_manager.songs  # Track lengths measured by the library scan
+        self.audio_player.replay_gain = library_manager.track_gain
         self.favorites_manager = favorites_manager
 
         # Initialize CommandHandler first
@@ -48,9 +65,11 @@ class MainWindow(QMainWindow):
         self.content_widget = QWidget()
         self.content_layout = QVBoxLayout(self.content_widget)
         self.stacked_widget = QStackedWidget()
+        self.album_art = AlbumArtCache()  # Shared by the playback bar and the albums page
+        self.album_art.art_ready.connect(self._on_album_art_ready)
         self._setup_main_page()
         self.playlists_page = PlaylistsPage(playlist_manager, library_manager, audio_player, self)
-        self.albums_page = AlbumsPage(library_manager)
+        self.albums_page = AlbumsPage(library_manager, self.album_art)
         self.favorites_page = FavoritesPage(favorites_manager, library_manager, audio_player, self)
 
         self.stacked_widget.addWidget(self.main_page_widget)
@@ -61,6 +80,12 @@ class MainWindow(QMainWindow):
 
         self.playback_controls_widget = QWidget()
         self._setup_playback_controls()
+        self.play_queue = PlayQueue()
+        self._queue_songs = None  # The song list the play queue was last built from
+        # Drives the player's gapless handover to the queued track
+        self.playback_timer = QTimer(self)
+        self.playback_timer.timeout.connect(self._poll_playback)
+        self.playback_timer.start(100)
         self.content_layout.addWidget(self.playback_controls_widget)
 
         self.layout.addWidget(self.content_widget)  # Ensure content widget is added to the main layout
@@ -71,7 +96,14 @@ class MainWindow(QMainWindow):
         self.voice_assistant.start()
 
     def closeEvent(self, event):
+        self.library_watcher.stop()
+        self._stop_library_scan()
+        self._stop_loudness_analysis()
+        self.album_art.shutdown()
         self.voice_assistant.stop()
+        self.favorites_manager.close()
+        self.playlist_manager.store.close()  # Shared with the favorites manager
+        self.audio_player.close()
         pygame.quit()
         super().closeEvent(event)
 
@@ -93,12 +125,33 @@ class MainWindow(QMainWindow):
             print(f"Error while processing command '{command}': {e}")
 
     def _play_selected_song_from_list(self, song):
-        self.audio_player.load(song['filepath'])
+        # Already queued, play it from there rather than queueing it again
+        track_position = self.play_queue.find(song['filepath'])
+        if track_position is not None:
+            self._play_track(self.play_queue.jump(track_position))
+            return
+        # Played in between, the rest of the queue carries on afterwards
+        self.play_queue.play_next(song['filepath'])
+        self._play_track(self.play_queue.next())
+
+    def _play_from_songs(self, songs, position):
+        # Picking another row of the list that is already queued only moves the cursor
+        if songs is not self._queue_songs:
+            self._queue_songs = songs
+            filepaths = songs.filepaths() if hasattr(songs, 'filepaths') else [song['filepath'] for song in songs]
+            self.play_queue.set_tracks(filepaths, start=position)
+        else:
+            self.play_queue.jump(position)
+        self._play_track(self.play_queue.current)
+
+    def _play_track(self, filepath):
+        song_info = self.library_manager.songs.get(filepath)
+        if not song_info:
+            return
+        self.audio_player.load(filepath)
         self.audio_player.play()
-        self._update_current_song_info(song)
+        self._update_current_song_info(song_info)
         self.play_pause_button.setIcon(QIcon("ui/neon_pause.png")) # Assuming you have a neon pause icon
-        self.current_playlist = [s['filepath'] for s in
-                                 self.library_manager.get_all_songs()]  # Or update based on the source list
 
     def _setup_side_navigation(self):
         self.side_nav_layout = QVBoxLayout(self.side_nav)
@@ -131,14 +184,53 @@ class MainWindow(QMainWindow):
         self.main_page_widget = QWidget()
         self.main_page_layout = QHBoxLayout(self.main_page_widget) # Use QHBoxLayout here
 
-        self.virtual_playlist_widget = QListWidget()
+        self.virtual_playlist_column = QWidget()
+        self.virtual_playlist_column.setFixedWidth(600) # Set a fixed width
+        virtual_playlist_layout = QVBoxLayout(self.virtual_playlist_column)
+        virtual_playlist_layout.setContentsMargins(0, 0, 0, 0)
+
+        # Scan progress, only visible while the library is being scanned in the background
+        self.scan_status_widget = QWidget()
+        scan_status_layout = QHBoxLayout(self.scan_status_widget)
+        scan_status_layout.setContentsMargins(0, 0, 0, 0)
+        self.scan_status_label = QLabel("Scanning library...")
+        self.cancel_scan_button = QPushButton("Cancel")
+        self.cancel_scan_button.clicked.connect(self._cancel_library_scan)
+        scan_status_layout.addWidget(self.scan_status_label)
+        scan_status_layout.addStretch(1)
+        scan_status_layout.addWidget(self.cancel_scan_button)
+        self.scan_status_widget.hide()
+        virtual_playlist_layout.addWidget(self.scan_status_widget)
+
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search songs, artists, albums...")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(30)  # Coalesce fast typing, the query itself takes milliseconds
+        self.search_timer.timeout.connect(self._apply_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+        virtual_playlist_layout.addWidget(self.search_box)
+
+        # Model/view so only the rows on screen cost anything, however big the library is
+        self.virtual_playlist_model = SongListModel()
+        self.virtual_playlist_widget = QListView()
+        self.virtual_playlist_widget.setModel(self.virtual_playlist_model)
+        self.virtual_playlist_widget.setItemDelegate(SongItemDelegate(self.virtual_playlist_widget))
+        self.virtual_playlist_widget.setUniformItemSizes(True)
+        self.virtual_playlist_widget.setMouseTracking(True)
+        self.virtual_playlist_widget.doubleClicked.connect(self._play_selected_song)
+        self.virtual_playlist_widget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.virtual_playlist_widget.customContextMenuRequested.connect(self._show_song_menu)
+        virtual_playlist_layout.addWidget(self.virtual_playlist_widget)
+        self.scan_worker = None
+        self.loudness_worker = None
         self._populate_virtual_playlist()
-        self.main_page_layout.addWidget(self.virtual_playlist_widget)
-        self.virtual_playlist_widget.setFixedWidth(600) # Set a fixed width
+        self.main_page_layout.addWidget(self.virtual_playlist_column)
 
         self.main_page_spacer = QWidget()
         self.main_page_layout.addWidget(self.main_page_spacer)
-        self.main_page_layout.setStretchFactor(self.virtual_playlist_widget, 0) # Don't stretch playlist
+        self.main_page_layout.setStretchFactor(self.virtual_playlist_column, 0) # Don't stretch playlist
         self.main_page_layout.setStretchFactor(self.main_page_spacer, 1) # Stretch the remaining space
 
         self.app_name_label = QLabel("VoxTune")
@@ -158,18 +250,93 @@ class MainWindow(QMainWindow):
             self.app_name_timer.stop()
             self.initial_display = False
 
-    def _populate_virtual_playlist(self):
-        self.virtual_playlist_widget.clear()
-        songs = self.library_manager.scan_library()
-        for song in songs:
-            item = SongListItem(song)
-            list_item = QListWidgetItem()
-            list_item.setSizeHint(item.sizeHint())
-            self.virtual_playlist_widget.addItem(list_item)
-            self.virtual_playlist_widget.setItemWidget(list_item, item)
+    def _populate_virtual_playlist(self, rescan=False):
+        songs = [] if rescan else self.library_manager.load_library()
+        self.virtual_playlist_model.set_songs(songs)
+        # Pick up changes on disk in the background, rows are streamed in only when we start from an empty list
+        self._start_library_scan(progressive=not songs)
+
+    def _apply_scan_batch(self, batch):
+        # The scan thread only parses, the songs change here on the UI thread
+        songs, _ = self.library_manager.apply_scan_batch(batch)
+        if self.scan_is_progressive and songs:
+            self._add_songs_to_virtual_playlist(songs)
+        if hasattr(self, 'albums_page'):
+            self.albums_page.refresh()  # Per batch, so the albums are right even if the scan is cancelled
+
+    def _add_songs_to_virtual_playlist(self, songs):
+        if not self.search_box.text().strip():  # A filtered list is refreshed once the scan is done
+            self.virtual_playlist_model.append_songs(songs)
+            self._queue_songs = None  # The list grew, queue it afresh next time a row is played
+
+    def _apply_search(self):
+        query = self.search_box.text().strip()
+        if query:
+            self._populate_virtual_playlist_with_list(self.library_manager.search(query))
+        else:
+            self._populate_virtual_playlist_with_list(self.library_manager.get_all_songs())
+
+    def _start_library_scan(self, progressive):
+        self.library_watcher.stop()
+        self._stop_library_scan()
+        self._stop_loudness_analysis()
+        self.scan_worker = LibraryScanWorker(self.library_manager)
+        self.scan_worker.batch_ready.connect(self._apply_scan_batch)
+        self.scan_worker.progress.connect(self._update_scan_progress)
+        self.scan_is_progressive = progressive
+        self.scan_worker.finished_scan.connect(self._on_library_scan_finished)
+        self.scan_status_label.setText("Scanning library...")
+        self.scan_status_widget.show()
+        self.scan_worker.start()
+
+    def _stop_library_scan(self):
+        if self.scan_worker is not None and self.scan_worker.isRunning():
+            self.scan_worker.cancel()
+            self.scan_worker.wait()
+
+    def _start_loudness_analysis(self):
+        # Songs analysed once keep their result in the index, so this only decodes new or changed files
+        if self.loudness_worker is not None and self.loudness_worker.isRunning():
+            return
+        self.loudness_worker = LoudnessWorker(self.library_manager)
+        self.loudness_worker.start()
+
+    def _stop_loudness_analysis(self):
+        if self.loudness_worker is not None and self.loudness_worker.isRunning():
+            self.loudness_worker.cancel()
+            self.loudness_worker.wait()
+
+    def _cancel_library_scan(self):
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+        self.scan_status_label.setText("Cancelling scan...")
+
+    def _update_scan_progress(self, found):
+        self.scan_status_label.setText(f"Scanning library... {found} songs")
+
+    def _on_library_scan_finished(self, changes):
+        if self.scan_worker.isRunning():
+            return  # A scan that was cancelled to start this one
+        self.scan_status_widget.hide()
+        if changes > 0 and (not self.scan_is_progressive or self.search_box.text().strip()):
+            # The rows on screen came from the index, show what is actually on disk now
+            self._apply_search()
+        # From here on changes on disk are applied incrementally
+        self.library_watcher.start()
+        self._start_loudness_analysis()
+
+    def _on_library_changed(self, batch):
+        updated_songs, removed_filepaths = self.library_manager.apply_scan_batch(batch)
+        if not updated_songs and not removed_filepaths:
+            return
+        if updated_songs:
+            self._start_loudness_analysis()
+        self._apply_search()
+        if hasattr(self, 'albums_page'):
+            self.albums_page.refresh()
 
     def refresh_virtual_playlist(self):
-        self._populate_virtual_playlist()
+        self._populate_virtual_playlist(rescan=True)
 
     def sort_virtual_playlist(self, sort_by, ascending):
         songs = self.library_manager.get_all_songs()
@@ -177,27 +344,29 @@ class MainWindow(QMainWindow):
         self._populate_virtual_playlist_with_list(sorted_songs)
 
     def _populate_virtual_playlist_with_list(self, song_list):
-        self.virtual_playlist_widget.clear()
-        for song in song_list:
-            item = SongListItem(song)
-            list_item = QListWidgetItem()
-            list_item.setSizeHint(item.sizeHint())
-            self.virtual_playlist_widget.addItem(list_item)
-            self.virtual_playlist_widget.setItemWidget(list_item, item)
+        self.virtual_playlist_model.set_songs(song_list)
 
     def _setup_playback_controls(self):
         self.playback_controls_widget = QWidget()
         controls_layout = QHBoxLayout(self.playback_controls_widget)
 
         self.current_album_art = QLabel()
-        pixmap = QPixmap(60, 60)
-        pixmap.fill(Qt.gray)
-        self.current_album_art.setPixmap(pixmap)
+        self.current_album_art.setFixedSize(60, 60)
+        self.current_album_art.setScaledContents(True)
+        self.placeholder_art = QPixmap(60, 60)
+        self.placeholder_art.fill(Qt.gray)
+        self.current_album_art.setPixmap(self.placeholder_art)
+        self.current_art_key = None
         controls_layout.addWidget(self.current_album_art)
 
         self.current_song_info = QLabel("No song playing")
         controls_layout.addWidget(self.current_song_info)
 
+        self.visualizer = None
+        if SpectrumAnalyzer is not None and self.audio_player.tap is not None:
+            self.visualizer = SpectrumWidget(SpectrumAnalyzer(self.audio_player.tap, self.audio_player.sample_rate))
+            controls_layout.addWidget(self.visualizer)
+
         spacer = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
         controls_layout.addItem(spacer)
 
@@ -215,21 +384,34 @@ class MainWindow(QMainWindow):
         controls_layout.addWidget(self.skip_forward_button)
         controls_layout.addWidget(self.next_button)
 
+        self.shuffle_button = QPushButton("Shuffle")
+        self.shuffle_button.setCheckable(True)
+        self.shuffle_button.toggled.connect(self._set_shuffle)
+        self.repeat_button = QPushButton("Repeat: off")
+        self.repeat_button.clicked.connect(self._cycle_repeat)
+        controls_layout.addWidget(self.shuffle_button)
+        controls_layout.addWidget(self.repeat_button)
+
         self.play_pause_button.clicked.connect(self._toggle_play_pause)
         self.next_button.clicked.connect(self._play_next)
         self.prev_button.clicked.connect(self._play_previous)
         self.skip_forward_button.clicked.connect(self._skip_forward)
         self.skip_backward_button.clicked.connect(self._skip_backward)
 
-    def _play_selected_song(self, item):
-        widget = self.virtual_playlist_widget.itemWidget(item)
-        if widget and widget.song_info:
-            song = widget.song_info
-            self.audio_player.load(song['filepath'])
-            self.audio_player.play()
-            self._update_current_song_info(song)
-            self.play_pause_button.setIcon(QIcon("ui/neon_pause.png")) # Assuming you have a neon pause icon
-            self.current_playlist = [s['filepath'] for s in self.library_manager.get_all_songs()] # Update current playlist
+    def _play_selected_song(self, index):
+        if index.isValid():
+            self._play_from_songs(self.virtual_playlist_model.songs(), index.row())
+
+    def _show_song_menu(self, pos):
+        index = self.virtual_playlist_widget.indexAt(pos)
+        if not index.isValid():
+            return
+        song = self.virtual_playlist_model.song_at(index.row())
+        menu = QMenu(self)
+        play_next_action = menu.addAction("Play Next")
+        if menu.exec_(self.virtual_playlist_widget.viewport().mapToGlobal(pos)) == play_next_action:
+            self.play_queue.play_next(song['filepath'])
+            self._queue_upcoming()
 
     def _toggle_play_pause(self):
         if self.audio_player.current_track:
@@ -240,16 +422,11 @@ class MainWindow(QMainWindow):
                 self.audio_player.pause()
                 self.play_pause_button.setIcon(QIcon("ui/neon_play.png"))
         elif self.library_manager.songs:
-            first_song = list(self.library_manager.songs.values())[0]
-            self.audio_player.load(first_song['filepath'])
-            self.audio_player.play()
-            self._update_current_song_info(first_song)
-            self.play_pause_button.setIcon(QIcon("ui/neon_pause.png"))
-            self.current_playlist = [s['filepath'] for s in self.library_manager.get_all_songs()]
+            self._play_from_songs(self.library_manager.get_all_songs(), 0)
 
     def _play_next(self):
-        if self.current_playlist:
-            next_track = self.audio_player.next(self.current_playlist)
+        if self.play_queue:
+            next_track = self.audio_player.next(self.play_queue)
             if next_track:
                 song_info = self.library_manager.songs.get(next_track)
                 if song_info:
@@ -257,14 +434,24 @@ class MainWindow(QMainWindow):
                     self.play_pause_button.setIcon(QIcon("ui/neon_pause.png"))
 
     def _play_previous(self):
-        if self.current_playlist:
-            prev_track = self.audio_player.prev(self.current_playlist)
+        if self.play_queue:
+            prev_track = self.audio_player.prev(self.play_queue)
             if prev_track:
                 song_info = self.library_manager.songs.get(prev_track)
                 if song_info:
                     self._update_current_song_info(song_info)
                     self.play_pause_button.setIcon(QIcon("ui/neon_pause.png"))
 
+    def _set_shuffle(self, shuffled):
+        self.play_queue.set_shuffle(shuffled)
+        self._queue_upcoming()
+
+    def _cycle_repeat(self):
+        mode = REPEAT_MODES[(REPEAT_MODES.index(self.play_queue.repeat) + 1) % len(REPEAT_MODES)]
+        self.play_queue.set_repeat(mode)
+        self.repeat_button.setText(f"Repeat: {mode}")
+        self._queue_upcoming()
+
     def _skip_forward(self):
         self.audio_player.skip_forward()
 
@@ -275,7 +462,30 @@ class MainWindow(QMainWindow):
         title = song_info.get('title', 'Unknown Title')
         artist = song_info.get('artist', 'Unknown Artist')
         self.current_song_info.setText(f"{title} - {artist}")
-        # Load album art here if you have that functionality
+        self.current_art_key = (artist, song_info.get('album', 'Unknown Album'))
+        pixmap = self.album_art.pixmap(self.current_art_key, [song_info['filepath']])
+        self.current_album_art.setPixmap(pixmap or self.placeholder_art)  # Filled in by _on_album_art_ready once loaded
+        self._queue_upcoming()
+
+    def _on_album_art_ready(self, key):
+        if key == self.current_art_key and self.audio_player.current_track:
+            pixmap = self.album_art.pixmap(key, [self.audio_player.current_track])
+            if pixmap is not None:
+                self.current_album_art.setPixmap(pixmap)
+
+    def _queue_upcoming(self):
+        # Let the player read the following track ahead of time for a gapless handover
+        self.audio_player.set_next(self.play_queue.peek_next(auto=True))
+
+    def _poll_playback(self):
+        if self.visualizer is not None and self.audio_player.current_track and not self.audio_player.paused:
+            self.visualizer.wake()
+        new_track = self.audio_player.poll()
+        if new_track:
+            self.play_queue.next(auto=True)  # The player already moved on to what peek_next gave it
+            song_info = self.library_manager.songs.get(new_track)
+            if song_info:
+                self._update_current_song_info(song_info)
 
     def show_notification(self, message):
         QMessageBox.information(self, "tunes", message)
@@ -286,14 +496,9 @@ class MainWindow(QMainWindow):
 
     def play_virtual_playlist(self, playlist_filepaths):
         if playlist_filepaths:
-            self.current_playlist = playlist_filepaths
-            first_track = playlist_filepaths[0]
-            song_info = self.library_manager.songs.get(first_track)
-            if song_info:
-                self.audio_player.load(first_track)
-                self.audio_player.play()
-                self._update_current_song_info(song_info)
-                self.play_pause_button.setIcon(QIcon("ui/neon_pause.png"))
+            self._queue_songs = None
+            self.play_queue.set_tracks(playlist_filepaths, start=0)
+            self._play_track(self.play_queue.current)
 
     def _apply_theme(self):
         palette = self.palette()
@@ -344,21 +549,12 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'virtual_playlist_widget'):
             self.virtual_playlist_widget.setStyleSheet(
                 """
-                QListWidget {
+                QListView {
                     background-color: #28003C;
                     color: white;
                     border: none;
                     outline: none;
                 }
-                QListWidget::item {
-                    padding: 10px;
-                }
-                QListWidget::item:selected {
-                    background-color: #460060;
-                }
-                QListWidget::item:hover {
-                    background-color: #320046;
-                }
                 QScrollBar:vertical {
                     background: #28003C;
                     width: 10px;
@@ -0,0 +1,89 @@
+class OrderedPlaylist:
+    """
+    A playlist as an ordered set of song filepaths: O(1) membership test, append and removal.
+
+    Removed entries leave a hole in the backing list that is only squeezed out when a
+    position is needed (indexing, moves) or the holes take up half the list.
+    """
+
+    def __init__(self, filepaths=()):
+        self._items = []
+        self._positions = {}  # {filepath: index into _items}
+        self._holes = 0
+        self.extend(filepaths)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __bool__(self):
+        return bool(self._positions)
+
+    def __contains__(self, filepath):
+        return filepath in self._positions
+
+    def __iter__(self):
+        return (filepath for filepath in self._items if filepath is not None)
+
+    def __getitem__(self, position):
+        self._compact()
+        return self._items[position]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"OrderedPlaylist({list(self)!r})"
+
+    def _compact(self):
+        if not self._holes:
+            return
+        self._items = [filepath for filepath in self._items if filepath is not None]
+        self._positions = {filepath: i for i, filepath in enumerate(self._items)}
+        self._holes = 0
+
+    def index(self, filepath):
+        self._compact()
+        return self._positions[filepath]
+
+    def append(self, filepath):
+        """Adds filepath at the end unless it's already there, returns whether it was added."""
+        if filepath in self._positions:
+            return False
+        self._positions[filepath] = len(self._items)
+        self._items.append(filepath)
+        return True
+
+    def extend(self, filepaths):
+        """Appends every filepath that isn't in the playlist yet, returns the ones that were added."""
+        return [filepath for filepath in filepaths if self.append(filepath)]
+
+    def remove(self, filepath):
+        position = self._positions.pop(filepath, None)
+        if position is None:
+            return False
+        self._items[position] = None
+        self._holes += 1
+        if self._holes > len(self._items) // 2:
+            self._compact()
+        return True
+
+    def move(self, old_position, new_position):
+        """Moves the song at old_position to new_position, shifting the songs in between."""
+        self._compact()
+        old_position = range(len(self._items))[old_position]  # Negative positions count from the end
+        new_position = range(len(self._items))[new_position]
+        filepath = self._items.pop(old_position)
+        self._items.insert(new_position, filepath)
+        for i in range(min(old_position, new_position), max(old_position, new_position) + 1):
+            self._positions[self._items[i]] = i
+
+    def reorder(self, filepaths):
+        """Replaces the order with filepaths, which must hold exactly the same songs."""
+        self._items = list(filepaths)
+        self._positions = {filepath: i for i, filepath in enumerate(self._items)}
+        self._holes = 0
+
+    def shuffle(self, rng):
+        self._compact()
+        rng.shuffle(self._items)
+        self._positions = {filepath: i for i, filepath in enumerate(self._items)}
@@ -0,0 +1,111 @@
+import time
+
+from core.top_k import TopK
+
+# Past this many half-lives the stored scores are scaled back down before floats lose precision
+MAX_EPOCH_HALF_LIVES = 64
+
+
+class PlayHistory:
+    """
+    Log of plays (track, timestamp, seconds listened) plus time-decayed scores. Plays are only
+    appended, except that removing a song deletes its plays so a rebuilt score can't bring it back.
+
+    A play at time t adds weight * 2 ** ((t - epoch) / half_life) to its song's score. Since
+    every score decays by the same factor as time passes, the stored scores never need to be
+    touched to stay in order; the real value at `now` is score * 2 ** ((epoch - now) / half_life).
+    So ranking the recently loved songs is a TopK read, however many plays were recorded.
+
+    Callers flush() (inside their own transaction if they like) to persist buffered plays.
+    """
+
+    def __init__(self, store, half_life_days=30.0, top_size=100):
+        self.store = store
+        self.half_life = half_life_days * 86400.0
+        self._pending_plays = []
+        self._dirty = set()
+        self._removed = set()  # Songs whose logged plays go at the next flush
+        self._meta_dirty = False
+        self.epoch = store.get_meta('play_history_epoch')
+        scores = dict(store.query(
+            "SELECT t.filepath, s.score FROM decayed_scores s JOIN tracks t ON t.id = s.track_id"))
+        if self.epoch is None or store.get_meta('play_history_half_life') != self.half_life:
+            self.epoch = time.time()
+            scores = self._scores_from_log()
+        self.top = TopK(top_size, scores)
+
+    def _scores_from_log(self):
+        """Replays the whole log, only needed the first time or when the half-life changed."""
+        scores = {}
+        rows = self.store.query(
+            "SELECT t.filepath, h.played_at, h.weight FROM play_history h JOIN tracks t ON t.id = h.track_id")
+        for filepath, played_at, weight in rows:
+            scores[filepath] = scores.get(filepath, 0.0) + weight * self._growth(played_at)
+        self._dirty.update(scores)
+        self._meta_dirty = True
+        return scores
+
+    def _growth(self, timestamp):
+        return 2.0 ** ((timestamp - self.epoch) / self.half_life)
+
+    @staticmethod
+    def play_weight(listened):
+        """A full play counts 1, skipping after a few seconds counts for (almost) nothing."""
+        if listened is None:
+            return 1.0
+        return max(0.0, min(1.0, listened / 30.0))
+
+    def record(self, song_filepath, listened=None, played_at=None):
+        played_at = time.time() if played_at is None else played_at
+        weight = self.play_weight(listened)
+        self._pending_plays.append((song_filepath, played_at, listened, weight))
+        if (played_at - self.epoch) / self.half_life > MAX_EPOCH_HALF_LIVES:
+            self._rebase(played_at)
+        if weight > 0:
+            self.top.increment(song_filepath, weight * self._growth(played_at))
+            self._dirty.add(song_filepath)
+
+    def _rebase(self, new_epoch):
+        self.top.scale(2.0 ** ((self.epoch - new_epoch) / self.half_life))
+        self.epoch = new_epoch
+        self._dirty.update(self.top.scores)
+        self._meta_dirty = True
+
+    def remove(self, song_filepath):
+        """Forgets the song's plays, the logged ones included."""
+        self._pending_plays = [play for play in self._pending_plays if play[0] != song_filepath]
+        self._removed.add(song_filepath)
+        self.top.remove(song_filepath)
+        self._dirty.add(song_filepath)
+
+    def recent_favorites(self, n=20, now=None):
+        """[(song_filepath, decayed score), ...] of the n songs loved most lately."""
+        decay = 2.0 ** ((self.epoch - (time.time() if now is None else now)) / self.half_life)
+        return [(filepath, score * decay) for filepath, score in self.top.most_common(n)]
+
+    def flush(self):
+        plays, self._pending_plays = self._pending_plays, []
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed = self._removed, set()
+        if not plays and not dirty and not removed and not self._meta_dirty:
+            return
+        store = self.store
+        with store.transaction() as connection:
+            # Before the new plays, a song played again after it was removed starts over
+            connection.executemany("DELETE FROM play_history WHERE track_id = ?",
+                                   [(store.track_id(filepath),) for filepath in removed])
+            connection.executemany(
+                "INSERT INTO play_history (track_id, played_at, listened, weight) VALUES (?, ?, ?, ?)",
+                [(store.track_id(filepath), played_at, listened, weight)
+                 for filepath, played_at, listened, weight in plays])
+            scores = self.top.scores
+            connection.executemany(
+                "INSERT OR REPLACE INTO decayed_scores VALUES (?, ?)",
+                [(store.track_id(filepath), scores[filepath]) for filepath in dirty if filepath in scores])
+            connection.executemany(
+                "DELETE FROM decayed_scores WHERE track_id = ?",
+                [(store.track_id(filepath),) for filepath in dirty if filepath not in scores])
+            if self._meta_dirty:
+                store.set_meta('play_history_epoch', self.epoch)
+                store.set_meta('play_history_half_life', self.half_life)
+                self._meta_dirty = False
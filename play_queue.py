@@ -0,0 +1,189 @@
+import random
+
+REPEAT_OFF = 'off'
+REPEAT_ALL = 'all'
+REPEAT_ONE = 'one'
+REPEAT_MODES = (REPEAT_OFF, REPEAT_ALL, REPEAT_ONE)
+
+
+class PlayQueue:
+    """
+    The order songs are played in, with a cursor on the one playing now.
+
+    Entries are addressed by position rather than by filepath, so a song can be queued more
+    than once and moving to the next or previous song is O(1). Shuffling only reorders the
+    queue's own play order; the sequence it was built from is copied, never touched.
+    """
+
+    def __init__(self, tracks=(), start=0, rng=None):
+        self.repeat = REPEAT_OFF
+        self.shuffled = False
+        self._rng = rng or random.Random()
+        self.set_tracks(tracks, start)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __bool__(self):
+        return bool(self._order)
+
+    def __iter__(self):
+        """Songs in play order."""
+        return (self._tracks[entry] for entry in self._order)
+
+    def set_tracks(self, tracks, start=0):
+        """Replaces the queue with tracks, the cursor on tracks[start] (None for no cursor)."""
+        self._tracks = list(tracks)
+        self._order = list(range(len(self._tracks)))
+        self._order_positions = list(self._order)  # {entry: position in _order}
+        self._unshuffled_order = None  # The order to go back to, while shuffled
+        self._queued_next = {}  # {filepath: entry} of the songs queued with play_next
+        self._cursor = None
+        if start is not None and self._tracks:
+            self._cursor = range(len(self._tracks))[start]
+        if self.shuffled:
+            self._shuffle_order()
+
+    @property
+    def current(self):
+        if self._cursor is None:
+            return None
+        return self._tracks[self._order[self._cursor]]
+
+    @property
+    def position(self):
+        """Position of the current song in play order, None when nothing is selected."""
+        return self._cursor
+
+    def jump(self, track_position):
+        """Moves the cursor to tracks[track_position] as given to set_tracks, returns that song."""
+        self._cursor = self._order_positions[range(len(self._tracks))[track_position]]
+        return self.current
+
+    def find(self, filepath):
+        """
+        The track position (see jump) of filepath, the nearest one after the current song if
+        it is queued more than once, or None if it isn't queued.
+        """
+        start = 0 if self._cursor is None else self._cursor
+        for position in range(start, start + len(self._order)):
+            entry = self._order[position % len(self._order)]
+            if self._tracks[entry] == filepath:
+                return entry
+        return None
+
+    def _step(self, offset, auto):
+        if not self._order:
+            return None
+        if self._cursor is None:
+            return 0 if offset > 0 else len(self._order) - 1
+        if auto and self.repeat == REPEAT_ONE:
+            return self._cursor
+        position = self._cursor + offset
+        if 0 <= position < len(self._order):
+            return position
+        if self.repeat == REPEAT_OFF:
+            return None
+        return position % len(self._order)
+
+    def peek_next(self, auto=True):
+        """The song next() would move to, without moving."""
+        position = self._step(1, auto)
+        return None if position is None else self._tracks[self._order[position]]
+
+    def next(self, auto=False):
+        """
+        Moves to the following song and returns it, or None at the end of the queue (the
+        cursor stays put). auto is for a song that finished on its own: with repeat one it
+        plays again, while skipping by hand always moves on.
+        """
+        position = self._step(1, auto)
+        if position is None:
+            return None
+        self._cursor = position
+        return self.current
+
+    def prev(self, auto=False):
+        position = self._step(-1, auto)
+        if position is None:
+            return None
+        self._cursor = position
+        return self.current
+
+    def play_next(self, filepath):
+        """
+        Queues filepath right after the current song, even if it is queued already. A song
+        queued this way that hasn't played yet is moved up instead of being queued twice.
+        """
+        position = 0 if self._cursor is None else self._cursor + 1
+        entry = self._queued_next.get(filepath)
+        if entry is not None and self._order_positions[entry] >= position:
+            del self._order[self._order_positions[entry]]
+            if self._unshuffled_order is not None:
+                self._unshuffled_order.remove(entry)
+        else:
+            self._tracks.append(filepath)
+            entry = len(self._tracks) - 1
+            self._queued_next[filepath] = entry
+            self._order_positions.append(position)
+        if self._unshuffled_order is not None:
+            # Unshuffled it comes after the song playing now as well
+            order = self._unshuffled_order
+            order.insert(0 if self._cursor is None else order.index(self._order[self._cursor]) + 1, entry)
+        self._order.insert(position, entry)
+        for i in range(position, len(self._order)):
+            self._order_positions[self._order[i]] = i
+
+    def set_repeat(self, mode):
+        if mode not in REPEAT_MODES:
+            raise ValueError(f"Unknown repeat mode: {mode}")
+        self.repeat = mode
+
+    def set_shuffle(self, shuffled):
+        """
+        Shuffles the play order with the current song first, or goes back to the order the
+        songs were given in, keeping the cursor on the same song. Songs queued with play_next
+        that are still to come stay right after the current song.
+        """
+        if shuffled == self.shuffled:
+            return
+        self.shuffled = shuffled
+        if shuffled:
+            self._shuffle_order()
+            return
+        current_entry = None if self._cursor is None else self._order[self._cursor]
+        upcoming = self._upcoming_queued()
+        moved = set(upcoming)
+        order = [entry for entry in self._unshuffled_order if entry not in moved]
+        position = 0 if current_entry is None else order.index(current_entry) + 1
+        order[position:position] = upcoming
+        self._unshuffled_order = None
+        self._set_order(order)
+        if current_entry is not None:
+            self._cursor = self._order_positions[current_entry]
+
+    def _upcoming_queued(self):
+        # Entries queued with play_next that are still to come, in play order
+        queued = set(self._queued_next.values())
+        return [entry for entry in self._order[0 if self._cursor is None else self._cursor + 1:] if entry in queued]
+
+    def _shuffle_order(self):
+        if self._unshuffled_order is None:
+            self._unshuffled_order = list(self._order)
+        current_entry = None if self._cursor is None else self._order[self._cursor]
+        upcoming = self._upcoming_queued()
+        kept = set(upcoming)
+        kept.add(current_entry)
+        order = [entry for entry in range(len(self._tracks)) if entry not in kept]
+        self._rng.shuffle(order)
+        if current_entry is not None:
+            upcoming.insert(0, current_entry)
+            self._cursor = 0
+        order[0:0] = upcoming
+        self._set_order(order)
+
+    def _set_order(self, order):
+        self._order = order
+        self._order_positions = [0] * len(order)
+        for position, entry in enumerate(order):
+            self._order_positions[entry] = position
@@ -0,0 +1,629 @@
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from collections import deque
+
+try:
+    import pygame
+except ImportError:  # Only needed to decode formats other than plain PCM WAV
+    pygame = None
+
+try:
+    import mutagen
+except ImportError:  # Track lengths are then only known once pygame decoded the track
+    mutagen = None
+
+from core.audio_output import NullOutput
+
+try:
+    from core.dsp import EqualPowerCrossfade
+except ImportError:  # NumPy missing, tracks follow each other without crossfading
+    EqualPowerCrossfade = None
+
+
+class WaveDecoder:
+    """Streams 16-bit PCM WAV files that already have the engine's sample rate and channel count."""
+
+    def __init__(self, filepath, sample_rate, channels):
+        self._wave = wave.open(filepath, 'rb')
+        if (self._wave.getsampwidth(), self._wave.getframerate(), self._wave.getnchannels()) != (2, sample_rate, channels):
+            self._wave.close()
+            raise ValueError(f"{filepath} isn't {sample_rate}Hz {channels} channel 16-bit PCM")
+        self.sample_rate = sample_rate
+        self.length = self._wave.getnframes() / sample_rate
+
+    def read(self, frames):
+        return self._wave.readframes(frames)
+
+    def seek(self, position):
+        self._wave.setpos(min(int(position * self.sample_rate), self._wave.getnframes()))
+
+    def close(self):
+        self._wave.close()
+
+
+FFMPEG = shutil.which('ffmpeg')  # Streams compressed formats when it is installed
+
+# 16-bit PCM is 10.6MB a minute at 44.1kHz stereo, so a whole track in memory is only
+# acceptable up to a point: 15 minutes is 159MB, twice that while crossfading
+MAX_IN_MEMORY_SECONDS = 15 * 60
+
+
+def _tag_length(filepath):
+    """Length in seconds from the file's headers, None if mutagen can't tell."""
+    if mutagen is None:
+        return None
+    try:
+        audio = mutagen.File(filepath)
+    except mutagen.MutagenError:
+        return None
+    length = getattr(audio.info, 'length', 0) if audio is not None else 0
+    return length or None
+
+
+class FfmpegDecoder:
+    """
+    Anything ffmpeg can read, decoded while it plays: an ffmpeg process writes PCM in the
+    engine's format to a pipe and read() takes the next frames from it, so only the pipe's
+    buffer is held besides the engine's ring. Seeking starts a new process at the position.
+    """
+
+    def __init__(self, filepath, sample_rate, channels):
+        length = _tag_length(filepath)
+        if length is None:
+            raise ValueError(f"Can't tell the length of {filepath}")
+        self.filepath = filepath
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.length = length
+        self._frame_bytes = channels * 2
+        self._process = None
+        self.seek(0.0)
+
+    def _start(self, position):
+        command = [FFMPEG, '-v', 'error', '-nostdin']
+        if position:
+            command += ['-ss', f"{position:.3f}"]
+        command += ['-i', self.filepath, '-f', 's16le', '-acodec', 'pcm_s16le',
+                    '-ar', str(self.sample_rate), '-ac', str(self.channels), '-']
+        # No console window popping up for every track on Windows
+        return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+
+    def read(self, frames):
+        wanted = frames * self._frame_bytes
+        chunks = []
+        while wanted > 0:
+            chunk = self._process.stdout.read(wanted)  # A pipe may return less than asked
+            if not chunk:
+                break
+            chunks.append(chunk)
+            wanted -= len(chunk)
+        return b''.join(chunks)
+
+    def seek(self, position):
+        self.close()
+        self._process = self._start(max(0.0, min(position, self.length)))
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+
+
+class PygameDecoder:
+    """
+    Anything the pygame mixer can load, decoded in one go into the mixer's sample format.
+    Seeking is then just moving an offset. The whole track sits in memory as PCM (see
+    MAX_IN_MEMORY_SECONDS), so this is only used when ffmpeg isn't installed, and tracks
+    longer than that are refused.
+    """
+
+    def __init__(self, filepath, sample_rate, channels):
+        if pygame is None:
+            raise RuntimeError(f"pygame is needed to decode {filepath}")
+        length = _tag_length(filepath)
+        if length is not None and length > MAX_IN_MEMORY_SECONDS:
+            raise ValueError(f"{filepath} is too long to decode in memory, ffmpeg is needed to play it")
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=sample_rate, size=-16, channels=channels)
+        if pygame.mixer.get_init() != (sample_rate, -16, channels):
+            raise ValueError(f"The mixer isn't running at {sample_rate}Hz {channels} channel 16-bit")
+        self._data = pygame.mixer.Sound(filepath).get_raw()
+        self._frame_bytes = channels * 2
+        self._offset = 0
+        self.sample_rate = sample_rate
+        self.length = len(self._data) / self._frame_bytes / sample_rate
+
+    def read(self, frames):
+        block = self._data[self._offset:self._offset + frames * self._frame_bytes]
+        self._offset += len(block)
+        return block
+
+    def seek(self, position):
+        self._offset = min(int(position * self.sample_rate) * self._frame_bytes, len(self._data))
+
+    def close(self):
+        self._data = b''
+
+
+def open_decoder(filepath, sample_rate, channels):
+    if filepath.lower().endswith('.wav'):
+        try:
+            return WaveDecoder(filepath, sample_rate, channels)
+        except (wave.Error, ValueError, EOFError):
+            pass  # Compressed or differently formatted WAV, the mixer converts it
+    if FFMPEG:
+        try:
+            return FfmpegDecoder(filepath, sample_rate, channels)
+        except (OSError, ValueError):
+            pass
+    return PygameDecoder(filepath, sample_rate, channels)
+
+
+class PcmBlock:
+    """A run of frames from one track. An empty block marks the end of the track."""
+    __slots__ = ('generation', 'track', 'start_frame', 'data')
+
+    def __init__(self, generation, track, start_frame, data):
+        self.generation = generation
+        self.track = track
+        self.start_frame = start_frame
+        self.data = data
+
+
+class PcmRingBuffer:
+    """
+    Fixed number of block slots between one producer (the decoder) and one consumer (the
+    output). put() waits while all slots are full, get() while they are all empty.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._read = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __len__(self):
+        return self._count
+
+    def put(self, block, timeout=None):
+        """Adds block, returns False if no slot came free within timeout."""
+        with self._not_full:
+            if self._count == self.capacity and not self._not_full.wait_for(lambda: self._count < self.capacity, timeout):
+                return False
+            self._slots[(self._read + self._count) % self.capacity] = block
+            self._count += 1
+            self._not_empty.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Takes the oldest block, None if there was none within timeout."""
+        with self._not_empty:
+            if self._count == 0 and not self._not_empty.wait_for(lambda: self._count > 0, timeout):
+                return None
+            block = self._slots[self._read]
+            self._slots[self._read] = None
+            self._read = (self._read + 1) % self.capacity
+            self._count -= 1
+            self._not_full.notify()
+            return block
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._read = 0
+            self._count = 0
+            self._not_full.notify_all()
+
+
+class EngineMetrics:
+    """Counters kept by the engine's threads, see snapshot()."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocks_decoded = 0
+        self.frames_decoded = 0
+        self.blocks_played = 0
+        self.underruns = 0  # Times the output found the buffer empty while a track was playing
+        self.decode_cpu = 0.0  # CPU seconds spent in the decoder thread
+        self.output_cpu = 0.0  # CPU seconds spent in the output thread
+        self.last_latency = None  # Seconds from play()/seek() to the first block reaching the output
+        self.max_latency = 0.0
+
+    def record_latency(self, latency):
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def snapshot(self, sample_rate):
+        audio_seconds = self.frames_decoded / sample_rate
+        return {
+            'blocks_decoded': self.blocks_decoded,
+            'blocks_played': self.blocks_played,
+            'audio_seconds': audio_seconds,
+            'underruns': self.underruns,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            # CPU seconds per second of audio, 0.01 is 1% of one core in real time
+            'decode_cpu_per_second': self.decode_cpu / audio_seconds if audio_seconds else 0.0,
+            'output_cpu_per_second': self.output_cpu / audio_seconds if audio_seconds else 0.0,
+        }
+
+
+class PlaybackEngine:
+    """
+    Decodes on one thread and plays on another, with a ring buffer of PCM blocks in between.
+
+    The decoder thread keeps the buffer full and moves straight on to the track set with
+    set_next(), so consecutive tracks play without a gap. The output thread hands blocks to
+    an AudioOutput (pygame, a null sink, a WAV file) and is what keeps time. Every play()
+    or seek() starts a new generation: blocks still buffered from before are dropped.
+
+    What happened on the threads is reported through take_events() as
+    ('started', previous_track, track, latency, gapless) and ('finished', track).
+
+    dsp (a core.dsp.DspChain) processes every block on the output thread, just before it
+    is played, so volume and EQ changes are heard within a block. With set_crossfade() the
+    decoder mixes the end of a track into the start of the next one.
+    """
+
+    def __init__(self, output=None, sample_rate=44100, channels=2, block_frames=2048, buffer_blocks=16,
+                 decoder_factory=open_decoder, dsp=None):
+        self.output = output or NullOutput()
+        self.dsp = dsp
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.decoder_factory = decoder_factory
+        self.metrics = EngineMetrics()
+        self._ring = PcmRingBuffer(buffer_blocks)
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)  # The decoder thread waits on this for work
+        self._events = deque()
+        self._running = False
+        self._playing = threading.Event()
+        self._threads = []
+        # Shared state, changed under _lock
+        self._generation = 0
+        self._request = None  # (filepath or None to keep the track, position) for the decoder thread
+        self._requested_at = None
+        self._announce = False  # Whether the pending request starts a track (play) or moves in it (seek)
+        self._next_track = None
+        self._decoding = False
+        self._output_track = None
+        self._position_frame = 0
+        self._position_clock = None
+        self._block_seconds = 0.0
+        self._paused_position = None
+        # Decoder thread only
+        self._decoder = None
+        self._decoder_track = None
+        self._decoder_frame = 0
+        self._prepared = None  # (filepath, decoder) opened ahead of time for set_next()
+        self._crossfade = None
+        self._outgoing = None  # Decoder of the track fading out while the next one fades in
+        self._fade = None
+        self._fade_offset = 0
+
+    def start(self):
+        if self._running:
+            return
+        self.output.open(self.sample_rate, self.channels)
+        self._running = True
+        self._threads = [threading.Thread(target=self._decode_loop, name="decoder", daemon=True),
+                         threading.Thread(target=self._output_loop, name="audio-output", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        with self._wake:
+            self._running = False
+            self._wake.notify_all()
+        self._playing.set()  # Let the output thread see we're done
+        self._ring.clear()
+        self.output.flush()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self.output.close()
+
+    # Commands, called from the UI thread
+
+    def _restart(self, filepath, position):
+        with self._wake:
+            if filepath is None and self._request is not None and self._request[0] is not None:
+                filepath = self._request[0]  # Seeking in a track the decoder hasn't opened yet
+            else:
+                self._requested_at = time.perf_counter()
+            self._generation += 1
+            self._request = (filepath, position)
+            self._announce = filepath is not None
+            self._decoding = True
+            self._position_frame = int(position * self.sample_rate)
+            self._position_clock = None
+            self._wake.notify_all()
+        self._ring.clear()
+        self.output.flush()
+
+    def play(self, filepath, position=0.0):
+        self._paused_position = None
+        self._restart(filepath, position)
+        self.output.resume()
+        self._playing.set()
+
+    def seek(self, position):
+        if self._paused_position is not None:
+            self._paused_position = position
+        self._restart(None, position)
+
+    def pause(self):
+        self._paused_position = self.position()
+        self._playing.clear()
+        self.output.pause()
+
+    def resume(self):
+        if self._paused_position is not None:
+            with self._lock:
+                self._position_frame = int(self._paused_position * self.sample_rate)
+                self._position_clock = None
+            self._paused_position = None
+        self.output.resume()
+        self._playing.set()
+
+    def stop(self):
+        self._playing.clear()
+        with self._wake:
+            self._generation += 1
+            self._request = None
+            self._next_track = None
+            self._decoding = False
+            self._output_track = None
+            self._wake.notify_all()
+        self._ring.clear()
+        self.output.flush()
+        self._paused_position = None
+
+    def set_next(self, filepath):
+        with self._wake:
+            self._next_track = filepath
+            self._wake.notify_all()
+
+    def set_volume(self, volume):
+        self.output.set_volume(volume)
+
+    def set_crossfade(self, seconds):
+        """Overlaps consecutive tracks by seconds with an equal-power fade, 0 for none."""
+        if seconds > 0 and EqualPowerCrossfade is None:
+            print("Crossfading needs NumPy, tracks will follow each other without it")
+        self._crossfade = EqualPowerCrossfade(self.sample_rate, seconds) if seconds > 0 and EqualPowerCrossfade else None
+
+    def position(self):
+        """Seconds into the track being heard."""
+        if self._paused_position is not None:
+            return self._paused_position
+        with self._lock:
+            position = self._position_frame / self.sample_rate
+            if self._position_clock is not None:
+                position += min(time.monotonic() - self._position_clock, self._block_seconds)
+        return max(0.0, position - self.output.latency)
+
+    def buffered_blocks(self):
+        return len(self._ring)
+
+    def take_events(self):
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    # Decoder thread
+
+    def _open(self, filepath):
+        if self._prepared is not None and self._prepared[0] == filepath:
+            decoder = self._prepared[1]
+            self._prepared = None
+            return decoder
+        return self.decoder_factory(filepath, self.sample_rate, self.channels)
+
+    def _prepare_next(self, next_track):
+        # Open the following track while the buffer is full anyway, so moving on to it costs nothing
+        if self._prepared is not None and self._prepared[0] != next_track:
+            self._prepared[1].close()
+            self._prepared = None
+        if next_track and self._prepared is None:
+            try:
+                self._prepared = (next_track, self.decoder_factory(next_track, self.sample_rate, self.channels))
+            except Exception as e:
+                print(f"Error preparing {next_track}: {e}")
+
+    def _switch_decoder(self, filepath, position=0.0):
+        if self._decoder is not None:
+            self._decoder.close()
+            self._decoder = None
+        self._decoder_track = filepath
+        self._decoder_frame = int(position * self.sample_rate)
+        self._decoder = self._open(filepath)
+        if position:
+            self._decoder.seek(position)
+
+    def _decode_loop(self):
+        while True:
+            with self._wake:
+                while self._running and not self._decoding:
+                    self._wake.wait()
+                if not self._running:
+                    break
+                request, self._request = self._request, None
+                generation = self._generation
+                next_track = self._next_track
+            try:
+                if request is not None:
+                    self._close_outgoing()
+                    filepath, position = request
+                    if filepath is None and self._decoder is not None:
+                        self._decoder.seek(position)
+                        self._decoder_frame = int(position * self.sample_rate)
+                    else:
+                        self._switch_decoder(filepath or self._decoder_track, position)
+                if self._decoder is None:
+                    self._end_of_stream(generation)
+                    continue
+                start = time.thread_time()
+                frames = self.block_frames
+                if self._crossfade is not None and next_track and self._outgoing is None:
+                    # Stop the block where the fade has to start, so tracks overlap by exactly its length
+                    lead = self._frames_left() - self._crossfade.frames
+                    if 0 < lead < frames:
+                        frames = lead
+                data = self._decoder.read(frames)
+                if data and self._outgoing is not None:
+                    data = self._mix_outgoing(data)
+                self.metrics.decode_cpu += time.thread_time() - start
+            except Exception as e:
+                print(f"Error decoding {self._decoder_track}: {e}")
+                data = b''
+            if data:
+                block = PcmBlock(generation, self._decoder_track, self._decoder_frame, data)
+                frames = len(data) // (self.channels * 2)
+                self._decoder_frame += frames
+                self.metrics.blocks_decoded += 1
+                self.metrics.frames_decoded += frames
+                self._put(block, generation, next_track)
+                crossfade = self._crossfade
+                if (crossfade is not None and next_track and self._outgoing is None
+                        and self._frames_left() <= crossfade.frames):
+                    self._start_crossfade(generation, crossfade)
+                continue
+            # End of the track, carry on with the next one without a gap if there is one
+            self._close_outgoing()
+            self._put(PcmBlock(generation, self._decoder_track, self._decoder_frame, b''), generation, None)
+            with self._wake:
+                if generation != self._generation:
+                    continue
+                next_track, self._next_track = self._next_track, None
+            if next_track:
+                try:
+                    self._switch_decoder(next_track)
+                    continue
+                except Exception as e:
+                    print(f"Error opening {next_track}: {e}")
+            self._end_of_stream(generation)
+
+        if self._decoder is not None:
+            self._decoder.close()
+        self._close_outgoing()
+        if self._prepared is not None:
+            self._prepared[1].close()
+
+    def _frames_left(self):
+        return int(self._decoder.length * self.sample_rate) - self._decoder_frame
+
+    def _start_crossfade(self, generation, crossfade):
+        # From here on blocks belong to the next track, with the rest of this one mixed in
+        with self._wake:
+            if generation != self._generation or not self._next_track:
+                return
+            next_track, self._next_track = self._next_track, None
+        self._put(PcmBlock(generation, self._decoder_track, self._decoder_frame, b''), generation, None)
+        outgoing, outgoing_track = self._decoder, self._decoder_track
+        self._decoder = None
+        try:
+            self._switch_decoder(next_track)
+        except Exception as e:
+            print(f"Error opening {next_track}: {e}")
+            self._decoder, self._decoder_track = outgoing, outgoing_track
+            return
+        self._outgoing = outgoing
+        self._fade = crossfade
+        self._fade_offset = 0
+
+    def _mix_outgoing(self, data):
+        frames = len(data) // (self.channels * 2)
+        tail = self._outgoing.read(frames)
+        mixed = self._fade.mix_pcm(tail, data, self._fade_offset, self.channels)
+        self._fade_offset += frames
+        if len(tail) < len(data) or self._fade_offset >= self._fade.frames:
+            self._close_outgoing()
+        return mixed
+
+    def _close_outgoing(self):
+        if self._outgoing is not None:
+            self._outgoing.close()
+            self._outgoing = None
+
+    def _end_of_stream(self, generation):
+        with self._wake:
+            if generation == self._generation:
+                self._decoding = False
+
+    def _put(self, block, generation, next_track):
+        while not self._ring.put(block, timeout=0.05):
+            if not self._running or generation != self._generation:
+                return
+            self._prepare_next(next_track)
+
+    # Output thread
+
+    def _output_loop(self):
+        starved = False
+        while self._running:
+            if not self._playing.wait(timeout=0.1):
+                continue
+            block = self._ring.get(timeout=0.05)
+            if block is None:
+                if self._decoding and not starved:
+                    self.metrics.underruns += 1
+                starved = True
+                continue
+            starved = False
+            if block.generation != self._generation:
+                continue  # Buffered before a seek or a new track
+            start = time.thread_time()
+            self._play_block(block)
+            self.metrics.output_cpu += time.thread_time() - start
+
+    def _play_block(self, block):
+        requested_at = self._requested_at
+        if requested_at is not None:
+            # First block since play() or seek()
+            self._requested_at = None
+            latency = time.perf_counter() - requested_at
+            self.metrics.record_latency(latency)
+            if self.dsp is not None:
+                self.dsp.reset()  # Filter state from before a seek would smear into the new position
+                self.dsp.set_track(block.track)
+            previous, self._output_track = self._output_track, block.track
+            if self._announce:
+                self._events.append(('started', previous, block.track, latency, False))
+        elif block.track != self._output_track:
+            # The decoder ran into the next track, it follows the last one without a gap
+            if self.dsp is not None:
+                self.dsp.set_track(block.track)
+            previous, self._output_track = self._output_track, block.track
+            self._events.append(('started', previous, block.track, 0.0, True))
+        if not block.data:
+            self._events.append(('finished', block.track))
+            return
+        with self._lock:
+            if block.generation != self._generation:
+                return
+            self._position_frame = block.start_frame
+            self._position_clock = time.monotonic()
+            self._block_seconds = len(block.data) / (self.channels * 2) / self.sample_rate
+        data = block.data
+        if self.dsp is not None:
+            try:
+                data = self.dsp.process(data)
+            except Exception as e:
+                print(f"Error in audio effects, playing the block unprocessed: {e}")
+        self.output.write(data)
+        self.metrics.blocks_played += 1
@@ -1,30 +1,65 @@
-import json
-import os
+import random
+from contextlib import contextmanager
+
+from core.app_store import AppDataStore
+from core.ordered_playlist import OrderedPlaylist
 
 class PlaylistManager:
-    def __init__(self, data_file):
+    """
+    Playlists are kept in memory as OrderedPlaylists and every change is written through to
+    the shared AppDataStore as a small transaction touching only the affected rows. The
+    database is written first and memory only changes once that worked, so the two can't
+    disagree after a failed write.
+    """
+
+    def __init__(self, data_file, store=None):
         self.data_file = data_file
+        self.store = store or AppDataStore.shared(data_file)
+        self._playlist_ids = {}
+        self._next_positions = {}
         self.playlists = self._load_playlists()
 
     def _load_playlists(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as f:
-                try:
-                    data = json.load(f)
-                    return data.get('playlists', {})
-                except json.JSONDecodeError:
-                    return {}
-        return {}
+        self._playlist_ids.clear()
+        self._next_positions.clear()
+        playlists = {}
+        for playlist_id, name in self.store.query("SELECT id, name FROM playlists ORDER BY id"):
+            self._playlist_ids[name] = playlist_id
+            playlists[name] = OrderedPlaylist()
+        rows = self.store.query(
+            "SELECT p.name, t.filepath, e.position FROM playlist_entries e "
+            "JOIN playlists p ON p.id = e.playlist_id JOIN tracks t ON t.id = e.track_id "
+            "ORDER BY e.playlist_id, e.position")
+        for name, filepath, position in rows:
+            playlists[name].append(filepath)
+            self._next_positions[name] = position + 1
+        return playlists
+
+    @contextmanager
+    def batch(self):
+        """Groups several changes into a single commit."""
+        try:
+            with self.store.transaction():
+                yield self
+        except BaseException:
+            # Changes made before the failure were rolled back with the rest, start over from the database
+            self.playlists = self._load_playlists()
+            raise
 
-    def _save_playlists(self):
-        data = {'playlists': self.playlists}
-        with open(self.data_file, 'w') as f:
-            json.dump(data, f, indent=4)
+    def _rewrite_playlist(self, connection, name, filepaths):
+        # Reorders touch every position anyway, write the playlist out again
+        playlist_id = self._playlist_ids[name]
+        connection.execute("DELETE FROM playlist_entries WHERE playlist_id = ?", (playlist_id,))
+        connection.executemany("INSERT INTO playlist_entries VALUES (?, ?, ?)",
+                               [(playlist_id, self.store.track_id(filepath), position)
+                                for position, filepath in enumerate(filepaths)])
 
     def create_playlist(self, name):
         if name not in self.playlists:
-            self.playlists[name] = []
-            self._save_playlists()
+            with self.store.transaction() as connection:
+                cursor = connection.execute("INSERT INTO playlists (name) VALUES (?)", (name,))
+            self._playlist_ids[name] = cursor.lastrowid
+            self.playlists[name] = OrderedPlaylist()
             return True
         return False
 
@@ -32,33 +67,67 @@ class PlaylistManager:
         return list(self.playlists.keys())
 
     def get_playlist_songs(self, name):
-        return self.playlists.get(name, [])
+        return list(self.playlists.get(name, ()))
 
     def add_song_to_playlist(self, playlist_name, song_filepath):
-        if playlist_name in self.playlists and song_filepath not in self.playlists[playlist_name]:
-            self.playlists[playlist_name].append(song_filepath)
-            self._save_playlists()
-            return True
-        return False
+        return self.add_songs_to_playlist(playlist_name, [song_filepath]) == 1
+
+    def add_songs_to_playlist(self, playlist_name, song_filepaths):
+        """Appends the songs that aren't in the playlist yet, returns how many were added."""
+        playlist = self.playlists.get(playlist_name)
+        if playlist is None:
+            return 0
+        added = [filepath for filepath in dict.fromkeys(song_filepaths) if filepath not in playlist]
+        if added:
+            first = self._next_positions.get(playlist_name, 0)
+            with self.store.transaction() as connection:
+                playlist_id = self._playlist_ids[playlist_name]
+                connection.executemany("INSERT INTO playlist_entries VALUES (?, ?, ?)",
+                                       [(playlist_id, self.store.track_id(filepath), first + i)
+                                        for i, filepath in enumerate(added)])
+            playlist.extend(added)
+            self._next_positions[playlist_name] = first + len(added)
+        return len(added)
 
     def remove_song_from_playlist(self, playlist_name, song_filepath):
         if playlist_name in self.playlists and song_filepath in self.playlists[playlist_name]:
+            with self.store.transaction() as connection:
+                connection.execute("DELETE FROM playlist_entries WHERE playlist_id = ? AND track_id = ?",
+                                   (self._playlist_ids[playlist_name], self.store.track_id(song_filepath)))
             self.playlists[playlist_name].remove(song_filepath)
-            self._save_playlists()
+            return True
+        return False
+
+    def move_song_in_playlist(self, playlist_name, old_position, new_position):
+        if playlist_name in self.playlists:
+            playlist = self.playlists[playlist_name]
+            filepaths = list(playlist)
+            positions = range(len(filepaths))  # Negative positions count from the end, as in OrderedPlaylist.move
+            new_position = positions[new_position]
+            filepaths.insert(new_position, filepaths.pop(positions[old_position]))
+            with self.store.transaction() as connection:
+                self._rewrite_playlist(connection, playlist_name, filepaths)
+            playlist.reorder(filepaths)
+            self._next_positions[playlist_name] = len(filepaths)
             return True
         return False
 
     def delete_playlist(self, name):
         if name in self.playlists:
+            with self.store.transaction() as connection:
+                connection.execute("DELETE FROM playlists WHERE id = ?", (self._playlist_ids.pop(name),))
             del self.playlists[name]
-            self._save_playlists()
+            self._next_positions.pop(name, None)
             return True
         return False
 
     def shuffle_playlist(self, playlist_name):
         if playlist_name in self.playlists:
-            import random
-            random.shuffle(self.playlists[playlist_name])
-            self._save_playlists()
+            filepaths = list(self.playlists[playlist_name])
+            random.shuffle(filepaths)
+            with self.store.transaction() as connection:
+                self._rewrite_playlist(connection, playlist_name, filepaths)
+            self.playlists[playlist_name].reorder(filepaths)
+            self._next_positions[playlist_name] = len(filepaths)
             return True
         return False
@@ -0,0 +1,71 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class LibraryScanWorker(QThread):
+    """
+    Runs LibraryManager.iter_scan_batches off the UI thread and hands the batches over to be
+    applied there with LibraryManager.apply_scan_batch, batches sent before a cancel included.
+    """
+    batch_ready = pyqtSignal(object)  # (unchanged, updated, removed), see iter_scan_batches
+    progress = pyqtSignal(int)  # Songs found so far
+    finished_scan = pyqtSignal(int)  # Songs added, changed or removed, -1 if cancelled
+
+    def __init__(self, library_manager, batch_size=200, parent=None):
+        super().__init__(parent)
+        self.library_manager = library_manager
+        self.batch_size = batch_size
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        found = 0
+        changes = 0
+        batches = self.library_manager.iter_scan_batches(self.batch_size)
+        try:
+            for batch in batches:
+                if self._cancelled:
+                    break
+                unchanged, updated, removed = batch
+                found += len(unchanged) + len(updated)
+                changes += len(updated) + len(removed)
+                self.batch_ready.emit(batch)
+                self.progress.emit(found)
+        except Exception as e:
+            print(f"Error while scanning the library: {e}")
+        finally:
+            batches.close()
+        self.finished_scan.emit(-1 if self._cancelled else changes)
+
+
+class LoudnessWorker(QThread):
+    """
+    Runs LibraryManager.iter_loudness_analysis off the UI thread. The decoding happens in
+    the manager's process pool, this thread only waits for the results.
+    """
+    progress = pyqtSignal(int)  # Songs analysed so far
+    finished_analysis = pyqtSignal(int)  # Songs analysed, -1 if cancelled
+
+    def __init__(self, library_manager, parent=None):
+        super().__init__(parent)
+        self.library_manager = library_manager
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        analysed = 0
+        batches = self.library_manager.iter_loudness_analysis()
+        try:
+            for batch in batches:
+                analysed += len(batch)
+                self.progress.emit(analysed)
+                if self._cancelled:
+                    break
+        except Exception as e:
+            print(f"Error while analysing loudness: {e}")
+        finally:
+            batches.close()
+        self.finished_analysis.emit(-1 if self._cancelled else analysed)
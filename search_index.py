@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_distance(a, b, max_distance):
+    """Levenshtein distance check that gives up as soon as a row exceeds max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over title, artist, album and path of the songs in a SongStore.
+    Query terms match token prefixes; a term that matches nothing falls back to fuzzy matching
+    (edit distance 1, or 2 for longer words) through a trigram index.
+    Kept up to date through the store's listener hooks, which may run on the scan thread.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._postings = {}  # {token: set(track_ids)}
+        self._trigrams = {}  # {trigram: set(tokens)}
+        self._sorted_tokens = None  # Rebuilt lazily after tokens come or go
+        for song in store.values():
+            self.song_added(song.track_id)
+        store.add_listener(self)
+
+    def _song_tokens(self, track_id):
+        store = self.store
+        directory, filename = os.path.split(store.filepaths[track_id])
+        text = " ".join((store.titles[track_id], store.strings[store.artist_ids[track_id]],
+                         store.strings[store.album_ids[track_id]], os.path.basename(directory),
+                         os.path.splitext(filename)[0]))
+        return set(tokenize(text))
+
+    def song_added(self, track_id):
+        with self._lock:
+            self._add_tokens(track_id)
+
+    def _add_tokens(self, track_id):
+        for token in self._song_tokens(track_id):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                for trigram in _trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+                self._sorted_tokens = None
+            postings.add(track_id)
+
+    def song_removed(self, track_id):
+        with self._lock:
+            self._remove_tokens(track_id)
+
+    def _remove_tokens(self, track_id):
+        for token in self._song_tokens(track_id):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(track_id)
+            if not postings:
+                del self._postings[token]
+                for trigram in _trigrams(token):
+                    tokens = self._trigrams.get(trigram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigrams[trigram]
+                self._sorted_tokens = None
+
+    def store_cleared(self):
+        with self._lock:
+            self._postings.clear()
+            self._trigrams.clear()
+            self._sorted_tokens = None
+
+    def _prefix_matches(self, term):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        position = bisect_left(tokens, term)
+        while position < len(tokens) and tokens[position].startswith(term):
+            yield tokens[position]
+            position += 1
+
+    def _fuzzy_matches(self, term):
+        max_distance = 1 if len(term) < 7 else 2
+        term_trigrams = _trigrams(term)
+        candidates = {}
+        for trigram in term_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                candidates[token] = candidates.get(token, 0) + 1
+        # Each edit destroys at most three trigrams
+        required = len(term_trigrams) - 3 * max_distance
+        for token, shared in candidates.items():
+            if shared >= required and _within_distance(term, token[:len(term) + max_distance], max_distance):
+                yield token
+
+    def _term_ids(self, term):
+        ids = set()
+        for token in self._prefix_matches(term):
+            ids |= self._postings[token]
+        if not ids and len(term) >= 3:
+            for token in self._fuzzy_matches(term):
+                ids |= self._postings[token]
+        return ids
+
+    def search(self, query, limit=None):
+        """Returns a SongView of the songs matching every word of query, ordered by title."""
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)  # Longest, most selective first
+        if not terms:
+            return self.store.sorted_view('name')
+        matches = None
+        # The store's lock first, the order its writers take them in, so the matches and the
+        # title order come from the same state of the library
+        with self.store.lock, self._lock:
+            for term in terms:
+                ids = self._term_ids(term)
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return self.store.view([])
+            name_index = self.store.sort_indexes['name']
+            if len(matches) >= len(self.store):
+                ordered = name_index.ids()
+            elif len(matches) > len(self.store) // 8:
+                # A plain pass over the title order beats sorting big result sets
+                ordered = array('l', filter(matches.__contains__, name_index.ids()))
+            else:
+                ordered = array('l', sorted(matches, key=name_index.ranks().__getitem__))
+        if limit is not None:
+            del ordered[limit:]
+        return self.store.view(ordered)
@@ -0,0 +1,363 @@
+import datetime
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+SONG_KEYS = ('title', 'artist', 'album', 'release_date', 'filepath', 'duration', 'bitrate', 'sample_rate', 'channels')
+
+
+class Song:
+    """
+    Lightweight handle on one row of a SongStore. Reads like the song dicts it replaced
+    (song['title'], song.get('release_date')) but holds no data of its own.
+    """
+    __slots__ = ('_store', 'track_id')
+
+    def __init__(self, store, track_id):
+        self._store = store
+        self.track_id = track_id
+
+    def __getitem__(self, key):
+        return self._store.value(self.track_id, key)
+
+    def get(self, key, default=None):
+        if key not in SONG_KEYS:
+            return default
+        return self._store.value(self.track_id, key)
+
+    def __contains__(self, key):
+        return key in SONG_KEYS
+
+    def keys(self):
+        return SONG_KEYS
+
+    def to_dict(self):
+        return {key: self[key] for key in SONG_KEYS}
+
+    def __eq__(self, other):
+        return isinstance(other, Song) and other._store is self._store and other.track_id == self.track_id
+
+    def __hash__(self):
+        return hash(self.track_id)
+
+    def __repr__(self):
+        return f"Song({self.track_id}, {self['title']!r})"
+
+
+class SongView:
+    """
+    Read-only sequence of songs backed by an array of track ids. Slicing and reversing
+    share the id array instead of copying song data.
+    """
+    __slots__ = ('_store', '_ids', '_reverse')
+
+    def __init__(self, store, ids, reverse=False):
+        self._store = store
+        self._ids = ids
+        self._reverse = reverse
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return SongView(self._store, array('l', (self.track_id_at(i) for i in range(*position.indices(len(self))))))
+        return Song(self._store, self.track_id_at(position))
+
+    def __iter__(self):
+        ids = reversed(self._ids) if self._reverse else self._ids
+        store = self._store
+        for track_id in ids:
+            yield Song(store, track_id)
+
+    def __bool__(self):
+        return len(self._ids) > 0
+
+    def track_id_at(self, position):
+        if position < 0:
+            position += len(self._ids)
+        if self._reverse:
+            position = len(self._ids) - 1 - position
+        return self._ids[position]
+
+    def track_ids(self):
+        return reversed(self._ids) if self._reverse else iter(self._ids)
+
+    def reversed(self):
+        return SongView(self._store, self._ids, not self._reverse)
+
+    def filepaths(self):
+        filepaths = self._store.filepaths
+        return [filepaths[track_id] for track_id in self.track_ids()]
+
+    def filter(self, predicate):
+        store = self._store
+        return SongView(store, array('l', (track_id for track_id in self.track_ids()
+                                           if predicate(Song(store, track_id)))))
+
+
+class SortIndex:
+    """
+    Track ids kept in order of a precomputed sort key. Additions are buffered and merged
+    the next time the order is needed, so bulk loads cost one sort instead of many inserts.
+    Everything goes through lock, the store's, since merging on read changes the index too.
+    """
+
+    def __init__(self, sort_key, lock):
+        self._key = lambda track_id: (sort_key(track_id), track_id)  # Ties keep insertion order
+        self._lock = lock
+        self._ids = array('l')
+        self._pending = set()
+        self._ranks = None  # {track_id: position} as an array, rebuilt lazily
+
+    def add(self, track_id):
+        with self._lock:
+            self._pending.add(track_id)
+
+    def discard(self, track_id):
+        """Must be called while the song still has the key it was indexed with."""
+        with self._lock:
+            if track_id in self._pending:
+                self._pending.remove(track_id)
+                return
+            ids = self._merged_ids()
+            position = bisect_left(ids, self._key(track_id), key=self._key)
+            if position < len(ids) and ids[position] == track_id:
+                del ids[position]
+                self._ranks = None
+
+    def ids(self):
+        """A copy of the ids in order, safe to use while other threads change the library."""
+        with self._lock:
+            return self._merged_ids()[:]
+
+    def _merged_ids(self):
+        if self._pending:
+            if len(self._pending) > 64 and len(self._pending) > len(self._ids) // 16:
+                self._ids.extend(self._pending)
+                self._ids = array('l', sorted(self._ids, key=self._key))
+            else:
+                for track_id in self._pending:
+                    insort(self._ids, track_id, key=self._key)
+            self._pending = set()
+            self._ranks = None
+        return self._ids
+
+    def ranks(self):
+        """
+        Array mapping track id to its position in the index, for ordering subsets in C.
+        Never changed once returned, changes to the index build a new one.
+        """
+        with self._lock:
+            ids = self._merged_ids()
+            if self._ranks is None:
+                ranks = array('l', [0]) * (max(ids) + 1 if ids else 0)
+                for position, track_id in enumerate(ids):
+                    ranks[track_id] = position
+                self._ranks = ranks
+            return self._ranks
+
+
+class SongStore:
+    """
+    Columnar storage for the library: one list/array per field, indexed by an integer track id.
+    Artist and album names are interned into a shared string table. Behaves like the old
+    {filepath: song_dict} mapping, values are Song handles.
+
+    Track ids are never reused, so a SongView taken before a song was removed stays readable.
+    Listeners (see add_listener) get song_added/song_removed calls to keep secondary indexes in sync.
+
+    Changes and the reads that walk the sort indexes or the id map hold lock, a reentrant
+    lock shared with every SortIndex, so the scan and the watcher can't change the library
+    under a sort or search running on the UI thread. Listeners are called with it held.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._listeners = []
+        self._reset()
+
+    def _reset(self):
+        self._ids = {}  # {filepath: track_id} for the songs currently in the library
+        self.filepaths = []
+        self.titles = []
+        self.artist_ids = array('I')
+        self.album_ids = array('I')
+        self.release_ordinals = array('i')  # date.toordinal(), 0 when unknown
+        # Audio properties from the scan, 0 when unknown
+        self.durations = array('d')  # seconds
+        self.bitrates = array('I')  # bits per second
+        self.sample_rates = array('I')
+        self.channels = array('B')
+        self.strings = []
+        self._string_ids = {}
+        self._all_ids = None  # Cached ids of all live songs, rebuilt after changes
+        # Collation keys are computed once when a song comes in, not on every sort
+        self.title_keys = []
+        self.string_keys = []
+        self.sort_indexes = {
+            'name': SortIndex(self.title_keys.__getitem__, self.lock),
+            'date': SortIndex(self.release_ordinals.__getitem__, self.lock),
+            'artist': SortIndex(lambda track_id: self.string_keys[self.artist_ids[track_id]], self.lock),
+            'album': SortIndex(lambda track_id: self.string_keys[self.album_ids[track_id]], self.lock),
+        }
+
+    def _intern(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(value)
+            self.string_keys.append(value.casefold())
+            self._string_ids[value] = string_id
+        return string_id
+
+    def add(self, song_info):
+        """Adds or updates a song from a dict with the SONG_KEYS, returns its track id."""
+        with self.lock:
+            filepath = song_info['filepath']
+            release_date = song_info.get('release_date')
+            ordinal = release_date.toordinal() if release_date else 0
+            artist_id = self._intern(song_info['artist'])
+            album_id = self._intern(song_info['album'])
+            track_id = self._ids.get(filepath)
+            if track_id is None:
+                track_id = len(self.filepaths)
+                self.filepaths.append(filepath)
+                self.titles.append(song_info['title'])
+                self.artist_ids.append(artist_id)
+                self.album_ids.append(album_id)
+                self.release_ordinals.append(ordinal)
+                self.durations.append(song_info.get('duration') or 0.0)
+                self.bitrates.append(song_info.get('bitrate') or 0)
+                self.sample_rates.append(song_info.get('sample_rate') or 0)
+                self.channels.append(song_info.get('channels') or 0)
+                self.title_keys.append(song_info['title'].casefold())
+                self._ids[filepath] = track_id
+                self._all_ids = None
+            else:
+                self._unindex(track_id)
+                self.titles[track_id] = song_info['title']
+                self.artist_ids[track_id] = artist_id
+                self.album_ids[track_id] = album_id
+                self.release_ordinals[track_id] = ordinal
+                self.durations[track_id] = song_info.get('duration') or 0.0
+                self.bitrates[track_id] = song_info.get('bitrate') or 0
+                self.sample_rates[track_id] = song_info.get('sample_rate') or 0
+                self.channels[track_id] = song_info.get('channels') or 0
+                self.title_keys[track_id] = song_info['title'].casefold()
+            for sort_index in self.sort_indexes.values():
+                sort_index.add(track_id)
+            for listener in self._listeners:
+                listener.song_added(track_id)
+            return track_id
+
+    def _unindex(self, track_id):
+        for listener in self._listeners:
+            listener.song_removed(track_id)
+        for sort_index in self.sort_indexes.values():
+            sort_index.discard(track_id)
+
+    def add_listener(self, listener):
+        """listener needs song_added(track_id), song_removed(track_id) and store_cleared() methods."""
+        self._listeners.append(listener)
+
+    def sorted_view(self, sort_by, ascending=True):
+        """
+        All songs ordered by one of the sort_indexes. Descending order is the same ids read backwards.
+        """
+        return SongView(self, self.sort_indexes[sort_by].ids(), reverse=not ascending)
+
+    def value(self, track_id, key):
+        if key == 'title':
+            return self.titles[track_id]
+        if key == 'artist':
+            return self.strings[self.artist_ids[track_id]]
+        if key == 'album':
+            return self.strings[self.album_ids[track_id]]
+        if key == 'release_date':
+            ordinal = self.release_ordinals[track_id]
+            return datetime.date.fromordinal(ordinal) if ordinal else None
+        if key == 'filepath':
+            return self.filepaths[track_id]
+        if key == 'duration':
+            return self.durations[track_id]
+        if key == 'bitrate':
+            return self.bitrates[track_id]
+        if key == 'sample_rate':
+            return self.sample_rates[track_id]
+        if key == 'channels':
+            return self.channels[track_id]
+        raise KeyError(key)
+
+    def song(self, track_id):
+        return Song(self, track_id)
+
+    def track_id(self, filepath):
+        return self._ids.get(filepath)
+
+    def is_library_view(self, songs):
+        """Whether songs is a view of the whole library as values() returns it."""
+        return isinstance(songs, SongView) and songs._store is self and songs._ids is self._all_ids
+
+    def view(self, track_ids):
+        return SongView(self, array('l', track_ids))
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+            for listener in self._listeners:
+                listener.store_cleared()
+
+    # Mapping interface, keyed by filepath like the dict this replaced
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __bool__(self):
+        return bool(self._ids)
+
+    def __contains__(self, filepath):
+        return filepath in self._ids
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, filepath):
+        return Song(self, self._ids[filepath])
+
+    def __setitem__(self, filepath, song_info):
+        if song_info['filepath'] != filepath:
+            raise ValueError(f"Song filepath {song_info['filepath']} doesn't match key {filepath}")
+        self.add(song_info)
+
+    def __delitem__(self, filepath):
+        with self.lock:
+            self._unindex(self._ids.pop(filepath))
+            self._all_ids = None
+
+    def get(self, filepath, default=None):
+        track_id = self._ids.get(filepath)
+        return default if track_id is None else Song(self, track_id)
+
+    def pop(self, filepath, default=None):
+        with self.lock:
+            track_id = self._ids.pop(filepath, None)
+            if track_id is None:
+                return default
+            self._unindex(track_id)
+            self._all_ids = None
+        return Song(self, track_id)
+
+    def keys(self):
+        with self.lock:
+            return list(self._ids)
+
+    def values(self):
+        """All songs in insertion order. Repeated calls share the same id array until the library changes."""
+        with self.lock:
+            if self._all_ids is None:
+                self._all_ids = array('l', sorted(self._ids.values()))
+            return SongView(self, self._all_ids)
+
+    def items(self):
+        return ((song['filepath'], song) for song in self.values())
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+
+SQRT2 = np.float32(np.sqrt(2))
+
+
+def _rfft_takes_out():
+    try:
+        np.fft.rfft(np.zeros(4), out=np.empty(3, dtype=np.complex128))
+        return True
+    except TypeError:  # NumPy before 2.0 always returns a new array
+        return False
+
+
+class SpectrumAnalyzer:
+    """
+    Bar heights and channel levels, from 0 to 1, of the latest audio in a core.dsp.PcmTap.
+
+    update() is meant to be called once per frame on the UI thread. It windows the newest
+    fft_size frames, runs an FFT and groups the bins into log-spaced bars, all in buffers
+    allocated up front. Bars fall back at fall_rate per second instead of jumping down.
+    """
+
+    def __init__(self, tap, sample_rate, fft_size=2048, bars=32, floor_db=-60.0, fall_rate=1.5,
+                 low=40.0, high=16000.0):
+        if fft_size > len(tap.ring):
+            raise ValueError(f"The tap only keeps {len(tap.ring)} frames, fewer than fft_size")
+        self.tap = tap
+        self.fft_size = fft_size
+        self.floor_db = floor_db
+        self.fall_rate = fall_rate
+        channels = tap.ring.shape[1]
+        # A full-scale sine in every channel comes out at 1.0 (0dB)
+        self._window = (np.hanning(fft_size) * (2 / np.hanning(fft_size).sum() / channels)).astype(np.float32)
+        # Channels first, reductions along contiguous rows are many times faster
+        self._frames = np.zeros((channels, fft_size), dtype=np.float32)
+        self._scratch = np.zeros((channels, fft_size), dtype=np.float32)
+        self._mono = np.zeros(fft_size, dtype=np.float32)
+        self._spectrum = np.zeros(fft_size // 2 + 1, dtype=np.complex128)
+        self._magnitude = np.zeros(fft_size // 2 + 1)
+        frequencies = np.geomspace(low, min(high, sample_rate / 2), bars + 1)
+        edges = np.unique(np.clip((frequencies * fft_size / sample_rate).astype(int), 1, fft_size // 2))
+        self._band_starts = edges[:-1]  # Bar i is the loudest bin from edges[i] up to edges[i + 1]
+        self._band_end = edges[-1]
+        self._bands = np.zeros(len(self._band_starts))
+        self.bars = np.zeros(len(self._band_starts))
+        self._levels = np.zeros(channels, dtype=np.float32)
+        self.levels = np.zeros(channels)  # RMS per channel
+        self.peaks = np.zeros(channels)  # Sample peak per channel
+        self._rfft_out = _rfft_takes_out()
+        self._seen = None
+        self._last_update = time.monotonic()
+
+    def update(self):
+        """Returns False when nothing changed since the last call, so there is nothing to repaint."""
+        now = time.monotonic()
+        fall = self.fall_rate * (now - self._last_update)
+        self._last_update = now
+        written = self.tap.frames_written
+        if written == self._seen:
+            if not self.bars.any() and not self.levels.any():
+                return False
+            # Playback stopped or paused, let everything fall back to zero
+            self._bands[:] = 0
+            self._levels[:] = 0
+            self._fall(self.bars, self._bands, fall)
+            self._fall(self.levels, self._levels, fall)
+            self.peaks[:] = 0
+            return True
+        self._seen = written
+        self._read_latest(written)
+
+        np.abs(self._frames, out=self._scratch)
+        self._scratch.max(axis=1, out=self._levels)
+        self.peaks[:] = self._levels
+        np.square(self._frames, out=self._scratch)
+        self._scratch.mean(axis=1, out=self._levels)
+        np.sqrt(self._levels, out=self._levels)
+        self._levels *= SQRT2  # A full-scale sine reads 1
+        np.minimum(self._levels, 1, out=self._levels)
+        self._fall(self.levels, self._levels, fall)
+
+        self._frames.sum(axis=0, out=self._mono)
+        self._mono *= self._window
+        if self._rfft_out:
+            np.fft.rfft(self._mono, out=self._spectrum)
+        else:
+            self._spectrum[:] = np.fft.rfft(self._mono)
+        np.abs(self._spectrum, out=self._magnitude)
+        np.maximum.reduceat(self._magnitude[:self._band_end], self._band_starts, out=self._bands)
+        # To 0..1 on a dB scale between floor_db and 0dB
+        np.maximum(self._bands, 1e-9, out=self._bands)
+        np.log10(self._bands, out=self._bands)
+        self._bands *= 20 / -self.floor_db
+        self._bands += 1
+        np.clip(self._bands, 0, 1, out=self._bands)
+        self._fall(self.bars, self._bands, fall)
+        return True
+
+    def _read_latest(self, written):
+        ring = self.tap.ring
+        end = written % len(ring)
+        start = end - self.fft_size
+        if start >= 0:
+            self._frames[:] = ring[start:end].T
+        else:
+            self._frames[:, :-start] = ring[start:].T
+            self._frames[:, -start:] = ring[:end].T
+
+    @staticmethod
+    def _fall(current, target, fall):
+        current -= fall
+        np.maximum(current, target, out=current)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from core.dsp import GainRamp
+
+
+def test_gain_ramp_lands_on_target_over_short_blocks():
+    ramp = GainRamp(44100, gain=1.0, ramp_seconds=0.03)
+    ramp.set_gain(0.3)
+    blocks = [np.ones((256, 2), dtype=np.float32) for _ in range(8)]  # 2048 frames, the ramp takes 1323
+    for block in blocks:
+        ramp.process(block)
+    assert ramp.gain == ramp.target == 0.3
+    samples = np.concatenate(blocks)[:, 0]
+    # A straight line, not a curve that creeps up on the target
+    np.testing.assert_allclose(np.diff(samples[:ramp.ramp_frames]), -0.7 / ramp.ramp_frames, atol=1e-6)
+    np.testing.assert_allclose(samples[ramp.ramp_frames - 1:], 0.3, atol=1e-6)
+
+
+def test_gain_ramp_fades_to_silence():
+    ramp = GainRamp(44100, gain=0.5)
+    ramp.set_gain(0.0)
+    for _ in range(20):
+        block = np.ones((100, 2), dtype=np.float32)
+        ramp.process(block)
+    assert ramp.gain == 0.0
+    assert not block.any()
@@ -0,0 +1,19 @@
+import wave
+
+import numpy as np
+
+from core.loudness import analyze_file
+
+
+def test_full_scale_negative_sample_is_the_peak(tmp_path):
+    filepath = str(tmp_path / "negative_peak.wav")
+    pcm = np.zeros((44100, 2), dtype=np.int16)
+    pcm[1000, 0] = -32768
+    pcm[2000, 1] = 16384
+    with wave.open(filepath, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(pcm.tobytes())
+    _, _, peak = analyze_file(filepath)
+    assert peak == 1.0
@@ -0,0 +1,28 @@
+import random
+
+from core.play_queue import PlayQueue
+
+
+def test_shuffle_keeps_play_next_songs_after_the_current_song():
+    queue = PlayQueue([f"{i}.mp3" for i in range(20)], start=3, rng=random.Random(1))
+    queue.play_next("x.mp3")
+    queue.play_next("y.mp3")
+    queue.set_shuffle(True)
+    songs = list(queue)
+    assert songs[:3] == ["3.mp3", "y.mp3", "x.mp3"]
+    assert queue.current == "3.mp3"
+    assert sorted(songs) == sorted([f"{i}.mp3" for i in range(20)] + ["x.mp3", "y.mp3"])
+    assert queue.next() == "y.mp3"
+
+
+def test_unshuffle_keeps_play_next_songs_after_the_current_song():
+    queue = PlayQueue([f"{i}.mp3" for i in range(20)], start=3, rng=random.Random(1))
+    queue.set_shuffle(True)
+    current = queue.next()
+    queue.play_next("x.mp3")
+    queue.set_shuffle(False)
+    songs = list(queue)
+    position = songs.index(current)
+    assert songs[position + 1] == "x.mp3"
+    assert [song for song in songs if song != "x.mp3"] == [f"{i}.mp3" for i in range(20)]
+    assert queue.current == current
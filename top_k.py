@@ -0,0 +1,74 @@
+import heapq
+
+
+class TopK:
+    """
+    Scores for any number of keys plus the k highest of them, kept current as scores grow.
+
+    Scores are expected to only go up (play counts, decayed play scores); an increment is
+    O(log k) and reading the top is O(k log k). Removing a key from the top refills it with
+    a full scan, which is the rare case.
+    """
+
+    def __init__(self, k, scores=None):
+        self.k = k
+        self.scores = dict(scores or {})
+        self._top = {}
+        self._heap = []  # (score, key) for the keys in _top, stale entries are skipped lazily
+        self._rebuild()
+
+    def _rebuild(self):
+        self._top = dict(heapq.nlargest(self.k, self.scores.items(), key=lambda item: item[1]))
+        self._heap = [(score, key) for key, score in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def _min_entry(self):
+        while self._heap:
+            score, key = self._heap[0]
+            if self._top.get(key) == score:
+                return score, key
+            heapq.heappop(self._heap)
+        return None
+
+    def increment(self, key, amount=1):
+        score = self.scores.get(key, 0) + amount
+        self.scores[key] = score
+        if key in self._top:
+            self._top[key] = score
+            heapq.heappush(self._heap, (score, key))
+            if len(self._heap) > 4 * self.k + 16:
+                self._heap = [(score, key) for key, score in self._top.items()]
+                heapq.heapify(self._heap)
+        elif len(self._top) < self.k:
+            self._top[key] = score
+            heapq.heappush(self._heap, (score, key))
+        else:
+            lowest = self._min_entry()
+            if lowest is not None and score > lowest[0]:
+                heapq.heappop(self._heap)
+                del self._top[lowest[1]]
+                self._top[key] = score
+                heapq.heappush(self._heap, (score, key))
+        return score
+
+    def scale(self, factor):
+        """Multiplies every score by factor, which doesn't change the order."""
+        self.scores = {key: score * factor for key, score in self.scores.items()}
+        self._top = {key: score * factor for key, score in self._top.items()}
+        self._heap = [(score, key) for key, score in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def remove(self, key):
+        if self.scores.pop(key, None) is None:
+            return False
+        if key in self._top:
+            self._rebuild()
+        return True
+
+    def get(self, key, default=0):
+        return self.scores.get(key, default)
+
+    def most_common(self, n=None):
+        """[(key, score), ...] of the top keys, highest first."""
+        items = sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+        return items if n is None else items[:n]
@@ -0,0 +1,70 @@
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+from PyQt5.QtCore import Qt, QTimer, QRectF, QSize
+from PyQt5.QtGui import QPainter, QColor
+
+
+class SpectrumWidget(QWidget):
+    """
+    Spectrum bars with a level meter per channel, painted from a core.spectrum.SpectrumAnalyzer.
+
+    A timer asks for a new frame up to fps times a second. Nothing waits on the audio: the
+    analyzer reads whatever the tap holds at that moment, and when the UI thread is busy
+    the ticks that were missed are simply dropped. The timer only runs while the widget is
+    visible and something is moving.
+    """
+
+    def __init__(self, analyzer, fps=60, parent=None):
+        super().__init__(parent)
+        self.analyzer = analyzer
+        self.setAttribute(Qt.WA_OpaquePaintEvent)  # Everything is painted, nothing behind needs to be
+        self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.bar_color = QColor(0, 255, 0)  # Neon green like the rest of the player
+        self.meter_color = QColor(0, 200, 255)
+        self.background = QColor(30, 0, 42)
+        self._bar_rect = QRectF()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(1000 // fps)
+        self.timer.timeout.connect(self._tick)
+
+    def sizeHint(self):
+        return QSize(180, 48)
+
+    def wake(self):
+        """Starts the timer again, e.g. when playback starts."""
+        if self.isVisible() and not self.timer.isActive():
+            self.timer.start()
+
+    def showEvent(self, event):
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def _tick(self):
+        if self.analyzer.update():
+            self.update()  # Coalesced by Qt, a repaint that is still pending isn't queued twice
+        else:
+            self.timer.stop()  # Silent and settled, wake() starts it again
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        analyzer = self.analyzer
+        levels = analyzer.levels
+        meter_width = 4
+        meters = len(levels) * (meter_width + 2)
+        height = self.height()
+        rect = self._bar_rect
+        for i, level in enumerate(levels):
+            rect.setRect(i * (meter_width + 2), height * (1 - level), meter_width, height * level)
+            painter.fillRect(rect, self.meter_color)
+        bars = analyzer.bars
+        step = (self.width() - meters - 2) / len(bars)
+        left = meters + 2
+        for i, bar in enumerate(bars):
+            rect.setRect(left + i * step, height * (1 - bar), max(1.0, step - 1), height * bar)
+            painter.fillRect(rect, self.bar_color)
+        painter.end()